@@ -0,0 +1,391 @@
+# Bitboard position representation for chess.py
+
+# Squares are numbered row*8 + col, matching the (row, col) positions used by
+# Chess.board, so square 0 is A8 and square 63 is H1.
+
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+COLOR_INDEX = {'white':0, 'black':1}
+
+BIT = [1 << sq for sq in range(64)]
+POS = [divmod(sq, 8) for sq in range(64)]
+FULL = (1 << 64) - 1
+
+# Castling rights bits
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+ALL_CASTLING = 15
+# CASTLING_MASK[sq] clears the rights lost when a piece moves from or to 'sq'
+CASTLING_MASK = [ALL_CASTLING]*64
+CASTLING_MASK[0] ^= BLACK_QUEENSIDE
+CASTLING_MASK[4] ^= BLACK_KINGSIDE | BLACK_QUEENSIDE
+CASTLING_MASK[7] ^= BLACK_KINGSIDE
+CASTLING_MASK[56] ^= WHITE_QUEENSIDE
+CASTLING_MASK[60] ^= WHITE_KINGSIDE | WHITE_QUEENSIDE
+CASTLING_MASK[63] ^= WHITE_KINGSIDE
+PROMOTIONS = ('queen', 'rook', 'bishop', 'knight')
+
+# Which moves Bitboards.legal_moves generates: all of them, captures and promotions
+# (including en passant and non-capturing promotions), or every other move
+ALL_MOVES, TACTICAL, QUIET = 0, 1, 2
+
+
+PROMOTION_CODES = {'queen':1, 'rook':2, 'bishop':3, 'knight':4}
+
+
+def encode_move(move):
+	# Packs a move into 15 bits: start square, destination square and promotion piece
+	start, destination = move[0], move[1][0]
+	code = start[0]*8 + start[1] | (destination[0]*8 + destination[1]) << 6
+	if len(move) > 2:
+		code |= PROMOTION_CODES[move[2]] << 12
+	return code
+
+
+def find_encoded(moves, code):
+	# Returns the move in 'moves' that encode_move packs to 'code', or None
+	for move in moves:
+		if encode_move(move) == code:
+			return move
+	return None
+
+
+def square(pos):
+	# Converts a (row, col) position to a square index
+	return pos[0]*8 + pos[1]
+
+
+def iter_bits(bb):
+	# Yields the square index of each set bit in a bitboard
+	while bb:
+		low = bb & -bb
+		yield low.bit_length() - 1
+		bb ^= low
+
+
+def lsb(bb):
+	# Returns the square index of the least significant set bit
+	return (bb & -bb).bit_length() - 1
+
+
+def popcount(bb):
+	return bin(bb).count('1')
+
+
+def _step_mask(sq, steps):
+	# Mask of the squares one step away from 'sq' in each of 'steps'
+	row, col = POS[sq]
+	mask = 0
+	for dr, dc in steps:
+		if 0 <= row+dr <= 7 and 0 <= col+dc <= 7:
+			mask |= BIT[(row+dr)*8 + col+dc]
+	return mask
+
+
+def _ray_mask(sq, dr, dc):
+	# Mask of every square from 'sq' (exclusive) to the edge in one direction
+	row, col = POS[sq]
+	mask = 0
+	row, col = row+dr, col+dc
+	while 0 <= row <= 7 and 0 <= col <= 7:
+		mask |= BIT[row*8 + col]
+		row, col = row+dr, col+dc
+	return mask
+
+
+KNIGHT_STEPS = ((-1,-2), (-2,-1), (-2,1), (-1,2), (1,-2), (2,-1), (2,1), (1,2))
+KING_STEPS = ((-1,0), (-1,1), (0,1), (1,1), (1,0), (1,-1), (0,-1), (-1,-1))
+
+# Directions are (row step, col step). The first four are orthogonal and the
+# last four diagonal. A direction is positive if it walks towards higher squares.
+DIRECTIONS = ((-1,0), (1,0), (0,-1), (0,1), (-1,-1), (-1,1), (1,-1), (1,1))
+ORTHOGONAL = (0, 1, 2, 3)
+DIAGONAL = (4, 5, 6, 7)
+POSITIVE = tuple(dr > 0 or (dr == 0 and dc > 0) for dr, dc in DIRECTIONS)
+
+KNIGHT_ATTACKS = [_step_mask(sq, KNIGHT_STEPS) for sq in range(64)]
+KING_ATTACKS = [_step_mask(sq, KING_STEPS) for sq in range(64)]
+# PAWN_ATTACKS[side][sq] holds the squares a pawn of 'side' on 'sq' attacks
+PAWN_ATTACKS = [[_step_mask(sq, ((-1,-1), (-1,1))) for sq in range(64)],
+	[_step_mask(sq, ((1,-1), (1,1))) for sq in range(64)]]
+RAYS = [[_ray_mask(sq, dr, dc) for sq in range(64)] for dr, dc in DIRECTIONS]
+
+
+def _between_table():
+	# BETWEEN[a][b] holds the squares strictly between two aligned squares (0 otherwise)
+	table = [[0]*64 for _ in range(64)]
+	for a in range(64):
+		for rays in RAYS:
+			for b in iter_bits(rays[a]):
+				table[a][b] = rays[a] ^ rays[b] ^ BIT[b]
+	return table
+
+
+BETWEEN = _between_table()
+
+
+def ray_attacks(direction, sq, occupied):
+	# Squares attacked along one ray, stopping at (and including) the first blocker
+	ray = RAYS[direction][sq]
+	blockers = ray & occupied
+	if blockers:
+		if POSITIVE[direction]:
+			ray ^= RAYS[direction][(blockers & -blockers).bit_length() - 1]
+		else:
+			ray ^= RAYS[direction][blockers.bit_length() - 1]
+	return ray
+
+
+def rook_attacks(sq, occupied):
+	return ray_attacks(0, sq, occupied) | ray_attacks(1, sq, occupied) | \
+		ray_attacks(2, sq, occupied) | ray_attacks(3, sq, occupied)
+
+
+def bishop_attacks(sq, occupied):
+	return ray_attacks(4, sq, occupied) | ray_attacks(5, sq, occupied) | \
+		ray_attacks(6, sq, occupied) | ray_attacks(7, sq, occupied)
+
+
+class Bitboards:
+	# A position stored as one 64-bit integer per piece type and color
+	# plus an occupancy mask for each color and for the whole board
+
+	def __init__(self):
+		self.pieces = [[0]*6, [0]*6]
+		self.occupied = [0, 0]
+		self.all = 0
+
+	@classmethod
+	def from_board(cls, board):
+		# Builds bitboards from a Chess.board style dict of (row, col) -> Piece
+		bitboards = cls()
+		for pos, piece in board.items():
+			bitboards.add(square(pos), COLOR_INDEX[piece.color], piece.kind)
+		return bitboards
+
+	def copy(self):
+		bitboards = Bitboards()
+		bitboards.pieces = [self.pieces[0][:], self.pieces[1][:]]
+		bitboards.occupied = self.occupied[:]
+		bitboards.all = self.all
+		return bitboards
+
+	def add(self, sq, side, kind):
+		bit = BIT[sq]
+		self.pieces[side][kind] |= bit
+		self.occupied[side] |= bit
+		self.all |= bit
+
+	def remove(self, sq, side, kind):
+		mask = ~BIT[sq]
+		self.pieces[side][kind] &= mask
+		self.occupied[side] &= mask
+		self.all &= mask
+
+	def move(self, from_sq, to_sq, side, kind):
+		# Moves a piece to an empty square
+		bits = BIT[from_sq] | BIT[to_sq]
+		self.pieces[side][kind] ^= bits
+		self.occupied[side] ^= bits
+		self.all ^= bits
+
+	def piece_at(self, sq):
+		# Returns (side, kind) of the piece on a square or None if it is empty
+		bit = BIT[sq]
+		if not self.all & bit:
+			return None
+		side = 0 if self.occupied[0] & bit else 1
+		for kind, bb in enumerate(self.pieces[side]):
+			if bb & bit:
+				return (side, kind)
+
+	def king_square(self, side):
+		return lsb(self.pieces[side][KING])
+
+	def positions(self, side):
+		# Returns the (row, col) positions of every piece of one side
+		return [POS[sq] for sq in iter_bits(self.occupied[side])]
+
+	def attackers_to(self, sq, side, occupied=None):
+		# Returns a bitboard of the pieces of 'side' attacking 'sq', found by looking
+		# outward from 'sq' along knight, pawn, king and slider rays
+		if occupied is None:
+			occupied = self.all
+		pieces = self.pieces[side]
+		attackers = (KNIGHT_ATTACKS[sq] & pieces[KNIGHT]) | \
+			(PAWN_ATTACKS[1-side][sq] & pieces[PAWN]) | (KING_ATTACKS[sq] & pieces[KING])
+		rooks = pieces[ROOK] | pieces[QUEEN]
+		if rooks:
+			attackers |= rook_attacks(sq, occupied) & rooks
+		bishops = pieces[BISHOP] | pieces[QUEEN]
+		if bishops:
+			attackers |= bishop_attacks(sq, occupied) & bishops
+		return attackers & occupied
+
+	def is_square_attacked(self, sq, side, occupied=None):
+		# Tests if any piece of 'side' attacks square 'sq'
+		if occupied is None:
+			occupied = self.all
+		pieces = self.pieces[side]
+		if KNIGHT_ATTACKS[sq] & pieces[KNIGHT] or PAWN_ATTACKS[1-side][sq] & pieces[PAWN] \
+			or KING_ATTACKS[sq] & pieces[KING]:
+			return True
+		rooks = pieces[ROOK] | pieces[QUEEN]
+		if rooks and rook_attacks(sq, occupied) & rooks:
+			return True
+		bishops = pieces[BISHOP] | pieces[QUEEN]
+		if bishops and bishop_attacks(sq, occupied) & bishops:
+			return True
+		return False
+
+	def attack_map(self, side):
+		# Returns every square attacked by 'side'
+		pieces = self.pieces[side]
+		occupied = self.all
+		attack_map = 0
+		for sq in iter_bits(pieces[KNIGHT]):
+			attack_map |= KNIGHT_ATTACKS[sq]
+		for sq in iter_bits(pieces[PAWN]):
+			attack_map |= PAWN_ATTACKS[side][sq]
+		for sq in iter_bits(pieces[KING]):
+			attack_map |= KING_ATTACKS[sq]
+		for sq in iter_bits(pieces[ROOK] | pieces[QUEEN]):
+			attack_map |= rook_attacks(sq, occupied)
+		for sq in iter_bits(pieces[BISHOP] | pieces[QUEEN]):
+			attack_map |= bishop_attacks(sq, occupied)
+		return attack_map
+
+	def legal_moves(self, side, castling_rights=0, ep_square=None, stage=ALL_MOVES):
+		# Generates only legal moves for 'side'. Checking pieces and pins are worked
+		# out once, so no candidate move has to be made and tested for check.
+		# Moves are returned in the Chess form (start_pos, (destination, special_info)),
+		# with the promotion piece name appended as a third item for promotions.
+		# 'stage' limits the moves to TACTICAL or QUIET ones.
+		moves = []
+		enemy = 1 - side
+		pieces = self.pieces[side]
+		enemy_pieces = self.pieces[enemy]
+		own = self.occupied[side]
+		occupied = self.all
+		king_sq = lsb(pieces[KING])
+		king_pos = POS[king_sq]
+		enemy_occupied = self.occupied[enemy]
+		if stage == TACTICAL:
+			stage_mask = enemy_occupied
+		elif stage == QUIET:
+			stage_mask = ~occupied & FULL
+		else:
+			stage_mask = FULL
+
+		# King moves, testing destinations with the king lifted off the board
+		without_king = occupied ^ BIT[king_sq]
+		for to in iter_bits(KING_ATTACKS[king_sq] & ~own & stage_mask):
+			if not self.is_square_attacked(to, enemy, without_king):
+				moves.append((king_pos, (POS[to], None)))
+
+		checkers = self.attackers_to(king_sq, enemy)
+		if checkers & (checkers - 1):
+			return moves  # Double check: only the king can move
+		if checkers:
+			check_mask = checkers | BETWEEN[king_sq][lsb(checkers)]
+		else:
+			check_mask = FULL
+
+		# Pinned pieces may only move along the line between the king and the pinner
+		pins = {}
+		orthogonal = enemy_pieces[ROOK] | enemy_pieces[QUEEN]
+		diagonal = enemy_pieces[BISHOP] | enemy_pieces[QUEEN]
+		for direction in range(8):
+			ray = RAYS[direction][king_sq]
+			sliders = orthogonal if direction < 4 else diagonal
+			if not ray & sliders:
+				continue
+			blockers = ray & occupied
+			if POSITIVE[direction]:
+				first = (blockers & -blockers).bit_length() - 1
+				rest = blockers ^ BIT[first]
+				second = (rest & -rest).bit_length() - 1
+			else:
+				first = blockers.bit_length() - 1
+				rest = blockers ^ BIT[first]
+				second = rest.bit_length() - 1
+			if BIT[first] & own and rest and BIT[second] & sliders:
+				pins[first] = ray ^ RAYS[direction][second]
+
+		targets = ~own & check_mask & stage_mask
+		for sq in iter_bits(pieces[KNIGHT]):
+			if sq in pins:
+				continue  # A pinned knight can never move along the pin
+			pos = POS[sq]
+			for to in iter_bits(KNIGHT_ATTACKS[sq] & targets):
+				moves.append((pos, (POS[to], None)))
+
+		# Queens are visited by both slider loops, once for each kind of ray
+		for sliders, attacks in ((pieces[BISHOP] | pieces[QUEEN], bishop_attacks), \
+			(pieces[ROOK] | pieces[QUEEN], rook_attacks)):
+			for sq in iter_bits(sliders):
+				dests = attacks(sq, occupied) & targets
+				if sq in pins:
+					dests &= pins[sq]
+				pos = POS[sq]
+				for to in iter_bits(dests):
+					moves.append((pos, (POS[to], None)))
+
+		# Pawns
+		step = -8 if side == 0 else 8
+		start_row = 6 if side == 0 else 1
+		promo_row = 0 if side == 0 else 7
+		if stage == ALL_MOVES:
+			pawn_mask = check_mask
+		else:
+			pawn_mask = enemy_occupied | 0xFF << (promo_row*8)
+			pawn_mask = check_mask & (pawn_mask if stage == TACTICAL else ~pawn_mask)
+		for sq in iter_bits(pieces[PAWN]):
+			if sq >> 3 == promo_row:
+				continue  # Awaiting promotion
+			dests = PAWN_ATTACKS[side][sq] & enemy_occupied
+			one = sq + step
+			if not occupied & BIT[one]:
+				dests |= BIT[one]
+				if sq >> 3 == start_row and not occupied & BIT[one+step]:
+					dests |= BIT[one+step]
+			dests &= pawn_mask
+			if sq in pins:
+				dests &= pins[sq]
+			pos = POS[sq]
+			for to in iter_bits(dests):
+				if to >> 3 == promo_row:
+					for promotion in PROMOTIONS:
+						moves.append((pos, (POS[to], None), promotion))
+				else:
+					moves.append((pos, (POS[to], None)))
+
+		# En passant, tested by clearing both pawns and looking for attacks on the king
+		if ep_square is not None and stage != QUIET:
+			to = ep_square[0]*8 + ep_square[1]
+			captured = to - step
+			if enemy_pieces[PAWN] & BIT[captured]:
+				for sq in iter_bits(PAWN_ATTACKS[enemy][to] & pieces[PAWN]):
+					after = (occupied ^ BIT[sq] ^ BIT[captured]) | BIT[to]
+					if not self.attackers_to(king_sq, enemy, after):
+						moves.append((POS[sq], (POS[to], POS[captured])))
+
+		# Castling
+		if castling_rights and not checkers and stage != TACTICAL:
+			row = 7 if side == 0 else 0
+			rooks = pieces[ROOK]
+			kingside, queenside = (WHITE_KINGSIDE, WHITE_QUEENSIDE) if side == 0 else \
+				(BLACK_KINGSIDE, BLACK_QUEENSIDE)
+			if castling_rights & kingside and rooks & BIT[row*8+7] \
+				and not occupied & (BIT[row*8+5] | BIT[row*8+6]) \
+				and not self.is_square_attacked(row*8+5, enemy) \
+				and not self.is_square_attacked(row*8+6, enemy):
+				moves.append((king_pos, ((row,6), (row,5))))
+			if castling_rights & queenside and rooks & BIT[row*8] \
+				and not occupied & (BIT[row*8+1] | BIT[row*8+2] | BIT[row*8+3]) \
+				and not self.is_square_attacked(row*8+3, enemy) \
+				and not self.is_square_attacked(row*8+2, enemy):
+				moves.append((king_pos, ((row,2), (row,3))))
+
+		return moves
+
+	def __eq__(self, other):
+		return isinstance(other, Bitboards) and self.pieces == other.pieces
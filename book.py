@@ -0,0 +1,199 @@
+# Binary opening book for chess.py
+#
+# Usage:
+#	python book.py --build games.pgn selfplay.bin --out book.bin     Build a book from games
+#	python book.py --build games.pgn --plies 20 --min-games 3 --out book.bin
+#	python book.py --book book.bin --fen FEN                           List the book moves of a position
+#
+# A book is a file of fixed-size records sorted by position hash, each holding the
+# Zobrist hash of a position (Chess.hash), a move played there (bitboard.encode_move)
+# and its weight. OpeningBook maps the file into memory and finds a position's moves
+# by binary search, so opening a book takes no time or heap memory and processes on
+# the same host share one copy through the page cache.
+#
+# To have the engine play from a book, set Chess.book; get_smart_move and get_best_move
+# then play a book move, chosen at random in proportion to its weight, while there is one.
+
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+
+import selfplay
+from chess import Chess, move_to_str
+from bitboard import encode_move
+from pgn import read_file
+
+MAGIC = b'CHESSBK1'
+# Record: position hash, encoded move and weight
+record_struct = struct.Struct('<QHH')
+RECORD_BYTES = record_struct.size
+MAX_WEIGHT = 0xFFFF
+
+
+class OpeningBook:
+	# A read-only, memory-mapped opening book
+
+	def __init__(self, path):
+		self.path = path
+		with open(path, 'rb') as stream:
+			if stream.read(len(MAGIC)) != MAGIC:
+				raise ValueError('Not an opening book: ' + path)
+			size = os.fstat(stream.fileno()).st_size
+			if (size - len(MAGIC)) % RECORD_BYTES:
+				raise ValueError('Truncated opening book: ' + path)
+			self.count = (size - len(MAGIC)) // RECORD_BYTES
+			self.data = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ) if self.count else b''
+		self.hits = 0
+		self.misses = 0
+
+	def close(self):
+		if self.count:
+			self.data.close()
+
+	def key_at(self, index):
+		return record_struct.unpack_from(self.data, len(MAGIC) + index*RECORD_BYTES)[0]
+
+	def entries(self, key):
+		# Returns the (encoded move, weight) pairs stored for the position hash 'key'
+		low, high = 0, self.count
+		while low < high:
+			middle = (low + high) // 2
+			if self.key_at(middle) < key:
+				low = middle + 1
+			else:
+				high = middle
+		entries = []
+		offset = len(MAGIC) + low*RECORD_BYTES
+		end = len(MAGIC) + self.count*RECORD_BYTES
+		while offset < end:
+			record_key, code, weight = record_struct.unpack_from(self.data, offset)
+			if record_key != key:
+				break
+			entries.append((code, weight))
+			offset += RECORD_BYTES
+		return entries
+
+	def moves(self, game):
+		# Returns the book moves of the position of 'game' as (move, weight) pairs, with
+		# moves in the form taken by Chess.push. Moves that are not legal there, which
+		# can only come from a hash collision, are left out.
+		entries = self.entries(game.hash)
+		if not entries:
+			return []
+		legal = {encode_move(move): move for move in game.legal_moves(game.turn)}
+		return [(legal[code], weight) for code, weight in entries if code in legal]
+
+	def choose(self, game):
+		# Returns a book move for the position of 'game', chosen at random in proportion
+		# to the weights, or None if the position is not in the book
+		moves = [(move, weight) for move, weight in self.moves(game) if weight]
+		if not moves:
+			self.misses += 1
+			return None
+		self.hits += 1
+		return random.choices([move for move, _ in moves], [weight for _, weight in moves])[0]
+
+	def __len__(self):
+		return self.count
+
+
+def pgn_plies(pgn_game):
+	# Yields (game, encoded move) for each move of a PGNGame, with the same Chess object
+	# at the position before the move each time
+	game = pgn_game.start()
+	for ply in range(len(pgn_game.moves)):
+		move = pgn_game.resolve(game, ply)
+		yield game, encode_move(move)
+		game.push(move)
+
+
+def game_plies(path):
+	# Yields (result, plies) for each game in a PGN file or a self-play file, where result
+	# is 1 for a white win, -1 for a black win and 0 for a draw or an unfinished game,
+	# and plies yields (game, encoded move) with the game at the position before each
+	# move. Plies raise ValueError at a move that cannot be played.
+	with open(path, 'rb') as stream:
+		is_selfplay = stream.read(len(selfplay.MAGIC)) == selfplay.MAGIC.encode()
+	if is_selfplay:
+		with open(path, 'rb') as stream:
+			fen = selfplay.read_header(stream)['fen']
+			for record in selfplay.read_records(stream):
+				result = {selfplay.WHITE_WINS: 1, selfplay.BLACK_WINS: -1}.get(record[1], 0)
+				yield result, zip(selfplay.record_positions(record, fen), record[3])
+	else:
+		for pgn_game in read_file(path):
+			yield {'1-0': 1, '0-1': -1}.get(pgn_game.result, 0), pgn_plies(pgn_game)
+
+
+def build(paths, out_path, plies=16, min_games=1, out=sys.stdout):
+	# Builds a book at 'out_path' from the first 'plies' moves of every game in the PGN
+	# and self-play files in 'paths'. A move is kept if it was played in at least
+	# 'min_games' games, weighted by two points for each win and one for each draw of
+	# the side that played it. Returns the number of records written.
+	counts = {}  # (position hash, encoded move) to [games, points]
+	games = 0
+	for path in paths:
+		for result, positions in game_plies(path):
+			games += 1
+			try:
+				for ply, (game, code) in enumerate(positions):
+					if ply >= plies:
+						break
+					entry = counts.get((game.hash, code))
+					if entry is None:
+						entry = counts[(game.hash, code)] = [0, 0]
+					entry[0] += 1
+					entry[1] += 1 + (result if game.turn == 'white' else -result)
+			except ValueError:
+				continue  # Keep the moves before an illegal or unreadable one
+
+	records = [(key, code, points) for (key, code), (played, points) in counts.items() \
+		if played >= min_games and points]
+	highest = max((points for _, _, points in records), default=0)
+	scale = MAX_WEIGHT / highest if highest > MAX_WEIGHT else 1
+	records.sort(key=lambda record: (record[0], -record[2], record[1]))
+
+	temp_path = out_path + '.tmp'
+	with open(temp_path, 'wb') as stream:
+		stream.write(MAGIC)
+		for key, code, points in records:
+			stream.write(record_struct.pack(key, code, max(1, int(points * scale))))
+	os.replace(temp_path, out_path)
+	out.write('%d games, %d positions and moves, %d records written to %s\n' % \
+		(games, len(counts), len(records), out_path))
+	return len(records)
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Build or query a binary opening book')
+	parser.add_argument('--build', nargs='+', metavar='FILE', help='PGN or self-play files to build a book from')
+	parser.add_argument('--out', default='book.bin', help='book file to build (default book.bin)')
+	parser.add_argument('--plies', type=int, default=16, help='moves per game to add (default 16)')
+	parser.add_argument('--min-games', type=int, default=1, help='games a move must be played in (default 1)')
+	parser.add_argument('--book', help='book file to query')
+	parser.add_argument('--fen', default=None, help='position to query (default the starting position)')
+	args = parser.parse_args(argv)
+
+	if args.build:
+		build(args.build, args.out, args.plies, args.min_games)
+		return 0
+	if not args.book:
+		parser.error('Give --build or --book')
+
+	book = OpeningBook(args.book)
+	game = Chess.from_fen(args.fen) if args.fen else Chess()
+	moves = book.moves(game)
+	total = sum(weight for _, weight in moves)
+	for move, weight in moves:
+		print('%-6s %6d %5.1f%%' % (move_to_str(move), weight, 100 * weight / total if total else 0))
+	if not moves:
+		print('Position not in book')
+	book.close()
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -3,7 +3,20 @@
 WHITE = 'white'
 BLACK = 'black'
 
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+import copy
 import random
+import struct
+
+from bitboard import Bitboards, COLOR_INDEX, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, \
+	ALL_CASTLING, CASTLING_MASK, PROMOTIONS, WHITE_KINGSIDE, WHITE_QUEENSIDE, \
+	BLACK_KINGSIDE, BLACK_QUEENSIDE, POS, ALL_MOVES, iter_bits, find_encoded
+from zobrist import PIECE_KEYS, BLACK_TO_MOVE, CASTLING_KEYS, zobrist_hash, pawn_hash, ep_key
+from evaluation import SQUARE_SCORES, board_score
+from search import Search
+from transposition import TranspositionTable
+from pawns import PawnTable
 
 class Chess:
 
@@ -11,9 +24,23 @@ class Chess:
 		self.turn = WHITE
 		self.board = {}
 		self.initialize_board()
-		self.all_moves = []
+		self.bitboards = Bitboards.from_board(self.board)
+		self.castling = ALL_CASTLING  # Castling rights bits
+		self.ep_square = None  # Square passed over by a pawn that just moved two spaces
+		self.halfmove_clock = 0  # Moves since the last capture or pawn move
+		self.fullmove_number = 1  # Starts at 1 and goes up after each black move
+		self.history = []  # Undo stack of records pushed by push()
+		self.hash = zobrist_hash(self.board, self.turn, self.castling, self.ep_square)
+		self.pawn_hash = pawn_hash(self.board)  # Hash of the pawns alone, for the pawn structure cache
+		self.score = board_score(self.board)  # Material and piece-square score for white, kept up to date
 		self.promotion_required = False
 		self.promotion_pos = (-1,-1)
+		self.transposition_table = None  # Created by the first call to get_best_move
+		self.pawn_table = None  # Pawn structure cache, also created by get_best_move
+		self.book = None  # book.OpeningBook consulted by get_smart_move and get_best_move
+		self.active_search = None  # The Search run by get_best_move while it is running
+		self.search_stats = None  # Counters from the last get_best_move search
+		self.search_settings = {}  # e.g. {'null_move':False} to switch off search techniques
 
 	def initialize_board(self):
 		for i in range(8):
@@ -26,9 +53,166 @@ class Chess:
 			self.board[(0,i)] = piece_order[i](BLACK)
 			self.board[(7,i)] = piece_order[i](WHITE)
 
-		# Append each piece's starting position to its pos_list
-		for key in self.board:
-			self.board[key].pos_list.append(key)
+		for pos, piece in self.board.items():
+			piece.pos = pos
+
+	@classmethod
+	def from_fen(cls, fen):
+		# Create a game from a position in Forsyth-Edwards Notation
+		game = cls()
+		game.set_fen(fen)
+		return game
+
+	def set_fen(self, fen):
+		# Replace the current position with one given in Forsyth-Edwards Notation.
+		# Raises ValueError, leaving the position unchanged, if the FEN is invalid.
+		fields = fen.split()
+		if len(fields) < 4:
+			raise ValueError('Invalid FEN: ' + fen)
+		placement, turn, castling, ep = fields[:4]
+
+		board = {}
+		rows = placement.split('/')
+		if len(rows) != 8:
+			raise ValueError('Invalid FEN: ' + fen)
+		for row, fen_row in enumerate(rows):
+			col = 0
+			for char in fen_row:
+				if char.isdigit():
+					col += int(char)
+					continue
+				if char.lower() not in fen_pieces or col > 7:
+					raise ValueError('Invalid FEN: ' + fen)
+				board[(row,col)] = fen_pieces[char.lower()](WHITE if char.isupper() else BLACK, (row,col))
+				col += 1
+			if col != 8:
+				raise ValueError('Invalid FEN: ' + fen)
+		for color in (WHITE, BLACK):
+			if sum(1 for piece in board.values() if piece.kind == KING and piece.color == color) != 1:
+				raise ValueError('Invalid FEN, each side needs one king: ' + fen)
+
+		if turn not in ('w', 'b'):
+			raise ValueError('Invalid FEN: ' + fen)
+		turn = WHITE if turn == 'w' else BLACK
+		castling_rights = 0
+		for char, right in castling_chars:
+			if char in castling:
+				castling_rights |= right
+		castling_rights = valid_castling(board, castling_rights)
+		if ep == '-':
+			ep_square = None
+		elif len(ep) == 2 and ep[0] in 'abcdefgh' and ep[1] == ('6' if turn == WHITE else '3'):
+			ep_square = (8-int(ep[1]), ord(ep[0])-97)
+		else:
+			raise ValueError('Invalid FEN: ' + fen)
+		try:
+			halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+			fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+		except ValueError:
+			raise ValueError('Invalid FEN: ' + fen)
+
+		self.board = board
+		self.turn = turn
+		self.castling = castling_rights
+		self.ep_square = ep_square
+		self.halfmove_clock = halfmove_clock
+		self.fullmove_number = fullmove_number
+		self.bitboards = Bitboards.from_board(self.board)
+		self.history = []
+		self.hash = zobrist_hash(self.board, self.turn, self.castling, self.ep_square)
+		self.pawn_hash = pawn_hash(self.board)
+		self.score = board_score(self.board)
+		self.promotion_required = False
+		self.promotion_pos = (-1,-1)
+
+	def to_fen(self):
+		# Returns the current position in Forsyth-Edwards Notation
+		rows = []
+		for row in range(8):
+			fen_row, empty = '', 0
+			for col in range(8):
+				piece = self.board.get((row,col))
+				if piece is None:
+					empty += 1
+					continue
+				if empty:
+					fen_row += str(empty)
+					empty = 0
+				char = 'n' if piece.kind == KNIGHT else piece.name[0]
+				fen_row += char.upper() if piece.color == WHITE else char
+			rows.append(fen_row + (str(empty) if empty else ''))
+
+		castling = ''.join(char for char, right in castling_chars if self.castling & right)
+		if self.ep_square is None:
+			ep = '-'
+		else:
+			ep = chr(self.ep_square[1]+97) + str(8-self.ep_square[0])
+		return '%s %s %s %s %d %d' % ('/'.join(rows), self.turn[0], castling or '-', ep, \
+			self.halfmove_clock, self.fullmove_number)
+
+	@classmethod
+	def from_binary(cls, data, offset=0):
+		# Create a game from a position packed by to_binary
+		game = cls()
+		game.set_binary(data, offset)
+		return game
+
+	def set_binary(self, data, offset=0):
+		# Replace the current position with the one packed by to_binary at 'offset' in 'data'
+		# Raises ValueError, leaving the position unchanged, if the piece codes are invalid.
+		occupied, codes, flags, ep, halfmove_clock, fullmove_number = \
+			position_struct.unpack_from(data, offset)
+		codes = int.from_bytes(codes, 'little')
+
+		board = {}
+		bitboards = Bitboards()
+		key = pawn_key = score = 0
+		for sq in iter_bits(occupied):
+			code = codes & 15
+			codes >>= 4
+			if not 1 <= code <= 12:
+				raise ValueError('Invalid position encoding')
+			side, kind = divmod(code-1, 6)
+			pos = POS[sq]
+			board[pos] = piece_classes[kind](WHITE if side == 0 else BLACK, pos)
+			bitboards.add(sq, side, kind)
+			key ^= PIECE_KEYS[side][kind][sq]
+			if kind == PAWN:
+				pawn_key ^= PIECE_KEYS[side][kind][sq]
+			score += SQUARE_SCORES[side][kind][sq]
+
+		self.board = board
+		self.bitboards = bitboards
+		self.halfmove_clock = halfmove_clock
+		self.fullmove_number = fullmove_number
+		self.turn = BLACK if flags & 1 else WHITE
+		self.castling = valid_castling(board, flags >> 1 & ALL_CASTLING)
+		# The en passant square is on the sixth row from the side to move
+		self.ep_square = None if not ep else (2 if self.turn == WHITE else 5, ep-1)
+		self.history = []
+		self.score = score
+		self.pawn_hash = pawn_key
+		self.hash = key ^ CASTLING_KEYS[self.castling]
+		if self.turn == BLACK:
+			self.hash ^= BLACK_TO_MOVE
+		self.hash ^= ep_key(board, self.turn, self.ep_square)
+		self.promotion_required = False
+		self.promotion_pos = (-1,-1)
+
+	def to_binary(self):
+		# Returns the position packed into POSITION_BYTES bytes: the occupied squares as a
+		# 64-bit mask, a 4-bit piece code for each of them in square order, the side to move
+		# and castling rights, the en passant file and the two move counters
+		codes, shift = 0, 0
+		board = self.board
+		for sq in iter_bits(self.bitboards.all):
+			piece = board[POS[sq]]
+			codes |= (piece.kind + (1 if piece.color == WHITE else 7)) << shift
+			shift += 4
+		flags = (1 if self.turn == BLACK else 0) | self.castling << 1
+		ep = 0 if self.ep_square is None else self.ep_square[1] + 1
+		return position_struct.pack(self.bitboards.all, codes.to_bytes(16, 'little'), flags, ep, \
+			min(self.halfmove_clock, 0xFFFF), min(self.fullmove_number, 0xFFFF))
 
 	def print_board(self, board=None):
 		board_view = [[' ' for _ in range(8)] for _ in range(8)]
@@ -56,61 +240,161 @@ class Chess:
 			print('No piece located at ' + str(target) + '.')
 			return
 
-		self.board[target].pos_list.append(destination)  # Append the destination to the pos_list
-		self.board[destination] = self.board[target]  # Move the piece to a new position
+		piece = self.board[target]
+		piece.pos = destination
+		self.board[destination] = piece  # Move the piece to a new position
 		del self.board[target]
-		self.all_moves.append(destination)
-
-	def do_move(self, move):
-		# Complete a full move
-		# Returns (start_pos, end_pos, captured_piece(rook_init_pos if castle is True), 
-		# captured_piece_pos (rook_final_pos if castle is True), castle)
-
+		from_sq, to_sq = target[0]*8 + target[1], destination[0]*8 + destination[1]
+		side = COLOR_INDEX[piece.color]
+		self.bitboards.move(from_sq, to_sq, side, piece.kind)
+		keys = PIECE_KEYS[side][piece.kind]
+		self.hash ^= keys[from_sq] ^ keys[to_sq]
+		if piece.kind == PAWN:
+			self.pawn_hash ^= keys[from_sq] ^ keys[to_sq]
+		scores = SQUARE_SCORES[side][piece.kind]
+		self.score += scores[to_sq] - scores[from_sq]
+
+	def remove_piece(self, pos):
+		# Remove the piece at 'pos' from the board and return it
+		piece = self.board.pop(pos)
+		sq, side = pos[0]*8 + pos[1], COLOR_INDEX[piece.color]
+		self.bitboards.remove(sq, side, piece.kind)
+		self.hash ^= PIECE_KEYS[side][piece.kind][sq]
+		if piece.kind == PAWN:
+			self.pawn_hash ^= PIECE_KEYS[side][PAWN][sq]
+		self.score -= SQUARE_SCORES[side][piece.kind][sq]
+		return piece
+
+	def place_piece(self, pos, piece):
+		# Put 'piece' on the empty position 'pos'
+		piece.pos = pos
+		self.board[pos] = piece
+		sq, side = pos[0]*8 + pos[1], COLOR_INDEX[piece.color]
+		self.bitboards.add(sq, side, piece.kind)
+		self.hash ^= PIECE_KEYS[side][piece.kind][sq]
+		if piece.kind == PAWN:
+			self.pawn_hash ^= PIECE_KEYS[side][PAWN][sq]
+		self.score += SQUARE_SCORES[side][piece.kind][sq]
+
+	def push(self, move):
+		# Make a move and record how to unmake it on the undo stack
+		# move is of the form (start_pos, (destination, special_info)) with an optional
+		# promotion piece name as a third item. A pawn reaching the last row without a
+		# promotion piece stays a pawn and the turn does not pass until it is promoted.
+		start, (destination, special) = move[0], move[1]
+		piece = self.board[start]
 		captured = None
+		self.hash ^= ep_key(self.board, self.turn, self.ep_square)  # Before the capturing pawn can move
 
-		if not move[1][1]:
-			# Normal move
-			if move[1][0] in self.board:
-				captured = self.board[move[1][0]]
-				del self.board[move[1][0]]
-			self.move_piece_basic(move[0], move[1][0])
-			return (move[0], move[1][0], captured, move[1][0], False)
-
+		if special and piece.kind == KING:
+			# Castling
+			self.move_piece_basic(start, destination)
+			self.move_piece_basic((start[0], 7 if destination[1] == 6 else 0), special)
+		else:
+			if special:
+				captured = self.remove_piece(special)  # En passant
+			elif destination in self.board:
+				captured = self.remove_piece(destination)
+			self.move_piece_basic(start, destination)
+
+		# Record: (move, moved piece, captured piece, castling rights, en passant square, halfmove clock)
+		self.history.append((move, piece, captured, self.castling, self.ep_square, self.halfmove_clock))
+		self.halfmove_clock = 0 if piece.kind == PAWN or captured else self.halfmove_clock + 1
+
+		self.hash ^= CASTLING_KEYS[self.castling]
+		self.castling &= CASTLING_MASK[start[0]*8 + start[1]] & \
+			CASTLING_MASK[destination[0]*8 + destination[1]]
+		self.hash ^= CASTLING_KEYS[self.castling]
+		if piece.kind == PAWN and abs(destination[0] - start[0]) == 2:
+			self.ep_square = ((start[0] + destination[0]) // 2, start[1])
+			self.hash ^= ep_key(self.board, WHITE if piece.color == BLACK else BLACK, self.ep_square)
 		else:
-			# Special move
-			if self.board[move[0]].name == 'pawn':
-				# En Passant
-				captured = self.board[move[1][1]]
-				del self.board[move[1][1]]
-				self.move_piece_basic(move[0], move[1][0])
-				return (move[0], move[1][0], captured, move[1][1], False)
-
-			if self.board[move[0]].name == 'king':
-				# Castling
-				rook_init_pos = (move[0][0],7) if move[1][0][1] == 6 else (move[0][0],0)
-				self.move_piece_basic(move[0], move[1][0])
-				self.move_piece_basic(rook_init_pos, move[1][1])
-				return (move[0], move[1][0], rook_init_pos, move[1][1], True)
+			self.ep_square = None
+
+		if len(move) > 2:
+			self.remove_piece(destination)
+			self.place_piece(destination, promotion_pieces[move[2]](piece.color))
+		elif piece.kind == PAWN and destination[0] in (0, 7):
+			return  # Awaiting promotion
+		if piece.color == BLACK:
+			self.fullmove_number += 1
+		self.turn = WHITE if piece.color == BLACK else BLACK
+		self.hash ^= BLACK_TO_MOVE
+
+	def pop(self):
+		# Unmake the last move made with push
+		move, piece, captured, castling, ep_square, self.halfmove_clock = self.history.pop()
+		start, (destination, special) = move[0], move[1]
+
+		self.hash ^= CASTLING_KEYS[self.castling] ^ CASTLING_KEYS[castling]
+		self.hash ^= ep_key(self.board, self.turn, self.ep_square)
+		if self.turn != piece.color:
+			self.hash ^= BLACK_TO_MOVE
+			if piece.color == BLACK:
+				self.fullmove_number -= 1
+		self.castling, self.ep_square = castling, ep_square
+
+		if len(move) > 2:
+			self.remove_piece(destination)
+			self.place_piece(destination, piece)
+
+		if special and piece.kind == KING:
+			self.undo_move(special, (start[0], 7 if destination[1] == 6 else 0))
+			self.undo_move(destination, start)
+		else:
+			self.undo_move(destination, start)
+			if captured:
+				self.place_piece(special or destination, captured)
+		self.turn = piece.color
+		self.hash ^= ep_key(self.board, self.turn, self.ep_square)
+		return move
+
+	def push_null(self):
+		# Pass the turn without moving, clearing the en passant square. Used by the search
+		# for null move pruning and undone with pop_null.
+		self.history.append((None, None, None, self.castling, self.ep_square, self.halfmove_clock))
+		self.hash ^= ep_key(self.board, self.turn, self.ep_square)
+		self.ep_square = None
+		self.halfmove_clock += 1
+		self.turn = WHITE if self.turn == BLACK else BLACK
+		self.hash ^= BLACK_TO_MOVE
+
+	def pop_null(self):
+		# Undo push_null
+		_, _, _, _, self.ep_square, self.halfmove_clock = self.history.pop()
+		self.turn = WHITE if self.turn == BLACK else BLACK
+		self.hash ^= BLACK_TO_MOVE ^ ep_key(self.board, self.turn, self.ep_square)
 
 	def undo_move(self, target, destination):
 		# Move a piece from 'target' to 'destination'
 		# Only use to undo moves
 
-		self.board[destination] = self.board[target]
+		piece = self.board[target]
+		piece.pos = destination
+		self.board[destination] = piece
 		del self.board[target]
-		del self.board[destination].pos_list[-1]
-		del self.all_moves[-1]
+		from_sq, to_sq = target[0]*8 + target[1], destination[0]*8 + destination[1]
+		side = COLOR_INDEX[piece.color]
+		self.bitboards.move(from_sq, to_sq, side, piece.kind)
+		keys = PIECE_KEYS[side][piece.kind]
+		self.hash ^= keys[from_sq] ^ keys[to_sq]
+		if piece.kind == PAWN:
+			self.pawn_hash ^= keys[from_sq] ^ keys[to_sq]
+		scores = SQUARE_SCORES[side][piece.kind]
+		self.score += scores[to_sq] - scores[from_sq]
+
+	def is_square_attacked(self, pos, by_color):
+		# Tests if any piece of color 'by_color' attacks position 'pos'
+		return self.bitboards.is_square_attacked(pos[0]*8 + pos[1], COLOR_INDEX[by_color])
+
+	def attack_map(self, color):
+		# Returns a bitboard of every square attacked by pieces of the given color
+		return self.bitboards.attack_map(COLOR_INDEX[color])
 
 	def can_see_king(self, color):
 		# Tests if any piece of the given color can see the opposite color king
-		piece_list = [self.board[pos] for pos in self.board if self.board[pos].color == color]
-		
-		opposite_king_pos = next(pos for pos in self.board if self.board[pos].name == 'king' and self.board[pos].color != color)
-
-		for piece in piece_list:
-			if opposite_king_pos in [move[0] for move in piece.available_moves(self.board, self.all_moves)]:
-				return True
-		return False
+		side = COLOR_INDEX[color]
+		return self.bitboards.is_square_attacked(self.bitboards.king_square(1-side), side)
 
 	def is_in_check(self, color):
 		# Checks if player specified by 'color' is in check
@@ -156,7 +440,7 @@ followed by its final position (e.g. \'a2a4\' or \'G8F6\'). Enter\n\
 				if self.board[move[0]].color != self.turn:
 					print('You must move a ' + self.turn + ' piece.')
 					continue
-				selected_piece_available_moves = self.board[move[0]].available_moves(self.board, self.all_moves)
+				selected_piece_available_moves = self.board[move[0]].available_moves(self.board, self.ep_square, self.castling)
 				valid_dests = [m[0] for m in selected_piece_available_moves]
 				if not move[1] in valid_dests:
 					print('Invalid move. Try again.')
@@ -170,20 +454,13 @@ followed by its final position (e.g. \'a2a4\' or \'G8F6\'). Enter\n\
 			
 			if quit: break
 			
-			# Move pieces and remove captured pieces from the board
-			self.do_move(move)
-
 			# Promotion
 			promo_row = 0 if self.turn == WHITE else 7
-			pos = self.all_moves[-1]
-			if pos[0] == promo_row and self.board[pos].name == 'pawn':
-				piece_class = self.get_promo_input()
-				old_pawn = self.board[pos]
-				del self.board[pos]
-				self.board[pos] = piece_class(old_pawn.color)
-				self.board[pos].pos_list = old_pawn.pos_list
+			if move[1][0][0] == promo_row and self.board[move[0]].name == 'pawn':
+				move = move + (self.get_promo_input(),)
 
-			self.turn = WHITE if self.turn == BLACK else BLACK
+			# Move pieces and remove captured pieces from the board
+			self.push(move)
 
 	def get_move(self):
 		try:
@@ -200,95 +477,107 @@ followed by its final position (e.g. \'a2a4\' or \'G8F6\'). Enter\n\
 
 	def has_move(self, color):
 		# Checks if player specified by 'color' has a valid move
+		return len(self.legal_moves(color)) > 0
 
-		# Get all possible moves specified by each pieces available_moves method
+	def legal_moves(self, color, stage=ALL_MOVES):
+		# Returns every legal move for 'color' in the form (start_pos, (destination, special_info)).
+		# Promotions get one move per promotion piece, named in a third item.
+		# 'stage' (bitboard.TACTICAL or QUIET) limits them to captures and promotions or the rest.
+		return self.bitboards.legal_moves(COLOR_INDEX[color], self.castling, self.ep_square, stage)
+
+	def legacy_moves(self, color):
+		# Returns every legal move for 'color' found with each piece's available_moves
+		# method and filtered with is_valid_move. Used to cross-check legal_moves.
 		moves = []
-		for pos in self.board:
-			if self.board[pos].color == color:
-				piece_moves = self.board[pos].available_moves(self.board, self.all_moves)
-				for move in piece_moves:
-					moves.append((pos, move))
+		for pos in self.bitboards.positions(COLOR_INDEX[color]):
+			piece = self.board[pos]
+			promo_row = 0 if piece.color == WHITE else 7
+			for m in piece.available_moves(self.board, self.ep_square, self.castling):
+				move = (pos, m)
+				if not self.is_valid_move(move):
+					continue
+				if piece.name == 'pawn' and m[0][0] == promo_row:
+					for promotion in PROMOTIONS:
+						moves.append(move + (promotion,))
+				else:
+					moves.append(move)
+		return moves
 
+	def perft(self, depth, legacy=False):
+		# Counts the positions reached after every sequence of 'depth' legal moves
+		# If legacy is True moves are generated with legacy_moves instead of legal_moves
+		if depth == 0:
+			return 1
+		moves = self.legacy_moves(self.turn) if legacy else self.legal_moves(self.turn)
+		if depth == 1:
+			return len(moves)
+		nodes = 0
 		for move in moves:
-			if self.is_valid_move(move):
-				return True
-		return False
+			self.push(move)
+			nodes += self.perft(depth-1, legacy)
+			self.pop()
+		return nodes
+
+	def divide(self, depth, legacy=False):
+		# Returns the perft count below each legal move, keyed by the move in coordinate notation
+		counts = {}
+		moves = self.legacy_moves(self.turn) if legacy else self.legal_moves(self.turn)
+		for move in moves:
+			self.push(move)
+			counts[move_to_str(move)] = self.perft(depth-1, legacy)
+			self.pop()
+		return counts
+
+	def find_move(self, string):
+		# Returns the legal move written in coordinate notation (e.g. 'e2e4' or 'e7e8q')
+		# in the form taken by push, or None if there is no such move
+		string = string.lower()
+		for move in self.legal_moves(self.turn):
+			if move_to_str(move) == string:
+				return move
+		return None
 
 	def is_valid_move(self, move):
 		# Tests if a move will put the player in check or not
 		# move is of the form (start_pos, (destination, special_info))
 		pos = move[0]
-		destination = move[1][0]
-		if not move[1][1] or self.board[pos].name != 'king':  # If move is not a castling move
-
-			# Get the correct piece and place to ressurect (captured piece)
-			if move[1][1] and self.board[pos].name == 'pawn':
-				piece_to_ressurect = self.board[move[1][1]]
-				place_to_ressurect = move[1][1]
-			else:
-				piece_to_ressurect = None if destination not in self.board else self.board[destination]
-				place_to_ressurect = destination
-
-			# Remove captured piece if applicable
-			if piece_to_ressurect:
-				del self.board[place_to_ressurect]
-
-			self.move_piece_basic(pos, destination)  # Move piece
-			in_check = self.is_in_check(self.board[destination].color)  # Check if checkmate is present
-			self.undo_move(destination, pos)  # Undo move
-
-			# Ressurect the captured piece
-			if piece_to_ressurect:
-				self.board[place_to_ressurect] = piece_to_ressurect
-
-			return not in_check
-
-		# If move is castling
-		rook_init_pos = (pos[0],7) if move[1][0][1] == 6 else (pos[0],0)
-		self.move_piece_basic(pos, destination)  # Move king
-		self.move_piece_basic(rook_init_pos, move[1][1])  # Move rook
-		in_check = self.is_in_check(self.board[destination].color)  # Check if checkmate is present
-		self.undo_move(move[1][1], rook_init_pos)  # Unmove rook
-		self.undo_move(destination, pos)  # Unmove king
-
-		if in_check:
-			return False
-
-		# Check if king moves through a position where it would be in check
-		castling_dir = 1 if move[1][0][1] == 6 else -1
-		self.move_piece_basic(pos, (pos[0], pos[1]+castling_dir))
-		in_check = self.is_in_check(self.board[(pos[0], pos[1]+castling_dir)].color)  # Check if checkmate is present
-		self.undo_move((pos[0], pos[1]+castling_dir), pos)
+		color = self.board[pos].color
+		if move[1][1] and self.board[pos].name == 'king':
+			# If move is castling
+			if self.is_in_check(color):
+				return False  # Cannot castle out of check
+
+			# Check if king moves through a position where it would be in check
+			castling_dir = 1 if move[1][0][1] == 6 else -1
+			side = COLOR_INDEX[color]
+			occupied = self.bitboards.all & ~(1 << (pos[0]*8 + pos[1]))  # The king has left its square
+			if self.bitboards.is_square_attacked(pos[0]*8 + pos[1]+castling_dir, 1-side, occupied):
+				return False
+
+		self.push(move)
+		in_check = self.is_in_check(color)  # Check if checkmate is present
+		self.pop()
 
 		return not in_check
 
 	def get_promo_input(self):
 		try:
 			piece = input('What would you like to promote your pawn to? ').lower()
-			return {'q':Queen, 'queen':Queen, 'k':Knight, 'knight':Knight, 'r':Rook, \
-			'rook':Rook, 'b':Bishop, 'bishop':Bishop}[piece]
+			return {'q':'queen', 'queen':'queen', 'k':'knight', 'knight':'knight', 'r':'rook', \
+			'rook':'rook', 'b':'bishop', 'bishop':'bishop'}[piece]
 		except:
 			print('Invalid response. Enter \'queen\', \'knight\', \'rook\', or \'bishop\'.')
 			return self.get_promo_input()
 
 	def get_available_moves(self, color):
-		moves = []
-		for pos in self.board:
-			if self.board[pos].color == color:
-				piece_moves = self.board[pos].available_moves(self.board, self.all_moves)
-				for m in piece_moves:
-					moves.append((pos, m))
-
-		# Delete invalid moves
-		for i, move in reversed(list(enumerate(moves))):
-			if not self.is_valid_move(move):
-				del moves[i]
+		moves = self.legal_moves(color)
 
 		if not moves:
 			print('No available moves.')
 			return
 
-		moves = [(move[0], move[1][0]) for move in moves]
+		# Promotions appear once per promotion piece, so drop the repeats
+		moves = list(dict.fromkeys((move[0], move[1][0]) for move in moves))
 
 		for i, move in enumerate(moves):
 			moves[i] = (chr(move[0][1]+97).upper() + str(8-move[0][0]) + ' to ' + \
@@ -333,16 +622,14 @@ followed by its final position (e.g. \'a2a4\' or \'G8F6\'). Enter\n\
 			if not promotion:
 				return (self.board, 5, 'promo failed')
 			try:
-				promo_piece = {'q':Queen, 'queen':Queen, 'k':Knight, 'knight':Knight, \
-				'r':Rook, 'rook':Rook, 'b':Bishop, 'bishop':Bishop}[promotion.lower()]
+				promo_piece = {'q':'queen', 'queen':'queen', 'k':'knight', 'knight':'knight', \
+				'r':'rook', 'rook':'rook', 'b':'bishop', 'bishop':'bishop'}[promotion.lower()]
 			except:
 				return (self.board, 5, 'promo failed')
-			old_pawn = self.board[self.promotion_pos]
-			del self.board[self.promotion_pos]
-			self.board[self.promotion_pos] = promo_piece(old_pawn.color)
-			self.board[self.promotion_pos].pos_list = old_pawn.pos_list
+			# Replay the pawn move, this time with the promotion piece
+			move = self.pop()
+			self.push(move + (promo_piece,))
 			self.promotion_required = False
-			self.turn = WHITE if self.turn == BLACK else BLACK
 			return (self.board, 6, 'promo sucessful')
 
 		if move is None:
@@ -354,7 +641,7 @@ followed by its final position (e.g. \'a2a4\' or \'G8F6\'). Enter\n\
 		if self.board[move[0]].color != self.turn:
 			return (self.board, -3, 'wrong color')
 
-		selected_piece_available_moves = self.board[move[0]].available_moves(self.board, self.all_moves)
+		selected_piece_available_moves = self.board[move[0]].available_moves(self.board, self.ep_square, self.castling)
 		valid_dests = [m[0] for m in selected_piece_available_moves]
 		if not move[1] in valid_dests:
 			return (self.board, -1, 'invalid')
@@ -364,18 +651,16 @@ followed by its final position (e.g. \'a2a4\' or \'G8F6\'). Enter\n\
 			return (self.board, -1, 'invalid')
 		
 		# Move pieces and remove captured pieces from the board
-		self.do_move(move)
+		self.push(move)
 
 		# Promotion
 		promo_row = 0 if self.turn == WHITE else 7
-		pos = self.all_moves[-1]
+		pos = move[1][0]
 		if pos[0] == promo_row and self.board[pos].name == 'pawn':
 			self.promotion_required = True
 			self.promotion_pos = pos
 			return (self.board, 4, 'promotion')
 
-		self.turn = WHITE if self.turn == BLACK else BLACK
-
 		if not self.has_move(self.turn):
 			if self.is_in_check(self.turn):
 				winner = WHITE if self.turn == BLACK else BLACK
@@ -387,6 +672,9 @@ followed by its final position (e.g. \'a2a4\' or \'G8F6\'). Enter\n\
 	def get_board(self):
 		return self.board
 
+	def get_hash(self):
+		return self.hash
+
 	def get_turn(self):
 		return self.turn
 
@@ -394,42 +682,24 @@ followed by its final position (e.g. \'a2a4\' or \'G8F6\'). Enter\n\
 		return self.promotion_required
 
 	def get_random_move(self, color):
-		moves = []
-		for pos in self.board:
-			if self.board[pos].color == color:
-				piece_moves = self.board[pos].available_moves(self.board, self.all_moves)
-				for m in piece_moves:
-					moves.append((pos, m))
+		moves = self.legal_moves(color)
 
 		if not moves:
 			return None
 
-		random.shuffle(moves)
-		move = moves.pop()
-		while not self.is_valid_move(move):
-			if len(moves) == 0:
-				return None
-			random.shuffle(moves)
-			move = moves.pop()
-
+		move = random.choice(moves)
 		return (move[0], move[1][0])
 
 	def get_smart_move(self, color):
 		if self.promotion_required:
 			return None
 
-		# Get all potential moves
-		moves = []
-		for pos in self.board:
-			if self.board[pos].color == color:
-				piece_moves = self.board[pos].available_moves(self.board, self.all_moves)
-				for move in piece_moves:
-					moves.append((pos, move))
+		move = self.book_move(color)
+		if move is not None:
+			return move[:2]
 
-		# Delete invalid moves
-		for i, move in reversed(list(enumerate(moves))):
-			if not self.is_valid_move(move):
-				del moves[i]
+		# Get all legal moves
+		moves = self.legal_moves(color)
 
 		# Get moves in which a piece is captured
 		capture_moves = []
@@ -440,16 +710,10 @@ followed by its final position (e.g. \'a2a4\' or \'G8F6\'). Enter\n\
 		# Get moves in which the opposing king is put in check
 		check_moves = []
 		for move in moves:
-			pos_start, pos_final, captured, captured_pos, castle = self.do_move(move)
+			self.push(move)
 			if self.can_see_king(color):
 				check_moves.append(move)
-			if castle:
-				self.undo_move(captured_pos, captured)
-				self.undo_move(pos_final, pos_start)
-			else:
-				self.undo_move(pos_final, pos_start)
-				if captured:
-					self.board[captured_pos] = captured
+			self.pop()
 
 		# Get moves which capture and put the opposing king in check
 		capture_and_check_moves = []
@@ -480,13 +744,89 @@ followed by its final position (e.g. \'a2a4\' or \'G8F6\'). Enter\n\
 		move = moves.pop()
 		return (move[0], move[1][0])
 
+	def get_best_move(self, color, time_ms=None, depth=None, nodes=None, on_iteration=None):
+		'''
+		Search for the best move for 'color' with alpha-beta and iterative deepening
+		The search stops at whichever of depth (plies), time_ms or nodes runs out
+		first, searching for one second if no budget is given.
+		on_iteration(depth, score, nodes, seconds, pv) is called after each depth.
+
+		Returns (move, score, pv) where move is of the form (start_pos, end_pos) with the
+		promotion piece name appended for promotions, score is in centipawns for 'color'
+		and pv is the list of moves the search expects to be played. Returns None if it
+		is not 'color's turn or a promotion is pending. If the position is in the opening
+		book set as self.book, a book move is returned at once with a score of 0.
+		'''
+
+		if self.promotion_required or color != self.turn:
+			return None
+		move = self.book_move(color)
+		if move is not None:
+			self.search_stats = None
+			return (move, 0, [move])
+		if time_ms is None and depth is None and nodes is None:
+			time_ms = 1000
+		if self.transposition_table is None:
+			self.transposition_table = TranspositionTable()
+		if self.pawn_table is None:
+			self.pawn_table = PawnTable()
+		self.active_search = Search(self, self.transposition_table, self.search_settings, self.pawn_table)
+		result = self.active_search.search(depth, time_ms, nodes, on_iteration)
+		self.search_stats = self.active_search.stats()
+		self.active_search = None
+		return result
+
+	def book_move(self, color):
+		# Returns a move for 'color' from the opening book, in the form returned by
+		# get_best_move, or None if there is no book or the position is not in it
+		if self.book is None or color != self.turn:
+			return None
+		move = self.book.choose(self)
+		if move is None:
+			return None
+		return (move[0], move[1][0]) + tuple(move[2:])
+
+	def stop_search(self):
+		# Make a get_best_move call running in another thread return as soon as possible
+		search = self.active_search
+		if search is not None:
+			search.stop()
+
+	def copy(self):
+		# Returns an independent copy of the position, without the undo history,
+		# that can be searched in another thread. The transposition and pawn tables
+		# and the opening book are shared.
+		game = copy.copy(self)
+		game.board = {}
+		for pos, piece in self.board.items():
+			game.board[pos] = type(piece)(piece.color, pos)
+		game.bitboards = self.bitboards.copy()
+		game.history = []
+		game.active_search = None
+		return game
+
+	def set_table_size(self, size_mb):
+		# Set the memory used by the search's transposition table in megabytes
+		if self.transposition_table is None:
+			self.transposition_table = TranspositionTable(size_mb)
+		else:
+			self.transposition_table.resize(size_mb)
+
 	########################################################################################
 
 class Piece:
+	# Pieces only hold their color and current position. Whether kings and rooks
+	# have moved and which pawn can be taken en passant is kept by Chess.
 
-	def __init__(self, color):
+	__slots__ = ('color', 'pos')
+
+	def __init__(self, color, pos=None):
 		self.color = color
-		self.pos_list = []
+		self.pos = pos  # Current (row, col) position, kept up to date by Chess
+
+	@property
+	def uni_char(self):
+		return self.white_char if self.color == WHITE else self.black_char
 
 	def no_conflict(self, board, pos):
 		# Checks if moving to position 'pos' is viable
@@ -494,151 +834,236 @@ class Piece:
 			return True
 		return False
 
-	def collect_linear_moves(self, board, directions):
-		# Gets all free spaces in the directions specified from a piece
+	def collect_linear_moves(self, board, rays):
+		# Gets all free spaces along each precomputed ray from a piece, up to and
+		# including the first piece of the other color
 		moves = []
-		pos = self.pos_list[-1]
-		for direc in directions:
-			pos_to_check = pos
-			while True:
-				pos_to_check = (pos_to_check[0]+direc[0], pos_to_check[1]+direc[1])
-				if self.no_conflict(board, pos_to_check):
-					moves.append((pos_to_check, None))
-				else:
-					break
-				if pos_to_check in board:
+		color = self.color
+		for ray in rays[self.pos]:
+			for pos in ray:
+				if pos in board:
+					if board[pos].color != color:
+						moves.append((pos, None))
 					break
+				moves.append((pos, None))
 		return moves
 
-	def test_move_list(self, board, move_list):
-		# Tests a list of relative moves to remove conflicts
-		pos = self.pos_list[-1]
-		moves = [((move[0]+pos[0], move[1]+pos[1]), None) for move in move_list]
-		for i, move in reversed(list(enumerate(moves))):
-			if not self.no_conflict(board, move[0]):
-				del moves[i]
-		return moves
+	def test_move_list(self, board, targets):
+		# Keeps the precomputed target positions not occupied by a piece of the same color
+		color = self.color
+		return [(pos, None) for pos in targets[self.pos] if pos not in board or board[pos].color != color]
 
 
 cardinals = [(1,0), (0,1), (-1,0), (0,-1)]
 diagonals = [(1,1), (-1,-1), (-1,1), (1,-1)]
 
 
+def is_on_board(pos):
+	# Checks if a position is on the board
+	if pos[0] >= 0 and pos[0] <= 7 and pos[1] >= 0 and pos[1] <= 7:
+		return True
+	return False
+
+
+def step_table(steps):
+	# Maps each position to the on-board positions one step away in each of 'steps'
+	return {(row,col): [(row+dr, col+dc) for dr, dc in steps if is_on_board((row+dr, col+dc))] \
+		for row in range(8) for col in range(8)}
+
+
+def ray_table(directions):
+	# Maps each position to a list of rays, each listing the positions from
+	# nearest to furthest in one of 'directions'
+	table = {}
+	for row in range(8):
+		for col in range(8):
+			rays = []
+			for dr, dc in directions:
+				ray = []
+				pos = (row+dr, col+dc)
+				while is_on_board(pos):
+					ray.append(pos)
+					pos = (pos[0]+dr, pos[1]+dc)
+				if ray:
+					rays.append(ray)
+			table[(row,col)] = rays
+	return table
+
+
+# Move tables computed once at import
+knight_targets = step_table(((-1,-2), (-2,-1), (-2,1), (-1,2), (1,-2), (2,-1), (2,1), (1,2)))
+king_targets = step_table(((-1,0), (-1,1), (0,1), (1,1), (1,0), (1,-1), (0,-1), (-1,-1)))
+pawn_captures = {WHITE:step_table(((-1,-1), (-1,1))), BLACK:step_table(((1,-1), (1,1)))}
+rook_rays = ray_table(cardinals)
+bishop_rays = ray_table(diagonals)
+queen_rays = ray_table(cardinals + diagonals)
+
+
 class Pawn(Piece):
 
-	def __init__(self, color):
-		super().__init__(color)
-		self.name = 'pawn'
-		self.uni_char = '♙' if color == BLACK else '♟'
-		self.dir = 1 if color == BLACK else -1
+	__slots__ = ()
+	kind = PAWN
+	name = 'pawn'
+	white_char, black_char = '♟', '♙'
 
-	def available_moves(self, board, all_moves):
+	def available_moves(self, board, ep_square=None, castling=0):
 		# Returns a list of tuples of length 2
 		# The first item is the available move final position
 		# The second item is None for a normal move and the position of the attacked piece for En Passant moves
 		moves = []
-		pos = self.pos_list[-1]
-		for dest in [(pos[0]+self.dir, pos[1]-1), (pos[0]+self.dir, pos[1]+1)]:
-			if dest in board and self.no_conflict(board, dest):
+		pos = self.pos
+		direction = 1 if self.color == BLACK else -1
+		for dest in pawn_captures[self.color][pos]:
+			if dest in board and board[dest].color != self.color:
 				moves.append((dest, None))
-		if (pos[0]+self.dir, pos[1]) not in board and is_on_board((pos[0]+self.dir, pos[1])):
-			moves.append(((pos[0]+self.dir, pos[1]), None))
+		if (pos[0]+direction, pos[1]) not in board and 0 <= pos[0]+direction <= 7:
+			moves.append(((pos[0]+direction, pos[1]), None))
 
-			if len(self.pos_list) == 1 and (pos[0]+2*self.dir, pos[1]) not in board:
-				moves.append(((pos[0]+2*self.dir, pos[1]), None))
+			start_row = 1 if self.color == BLACK else 6
+			if pos[0] == start_row and (pos[0]+2*direction, pos[1]) not in board:
+				moves.append(((pos[0]+2*direction, pos[1]), None))
 
 		# En Passant
-		en_passant_row = 4 if self.color == BLACK else 3
-		# Make sure the attacking piece is in the right row for en passant
-		if pos[0] == en_passant_row:
-			en_passant_positions = [(pos[0], pos[1]-1), (pos[0], pos[1]+1)]
-			for target_piece_pos in en_passant_positions:
-				if target_piece_pos in board and board[target_piece_pos].color != self.color:
-					if board[target_piece_pos].name == 'pawn':
-						# Make sure the attacked pawn just moved to the position
-						if len(board[target_piece_pos].pos_list) == 2 and all_moves[-1] == target_piece_pos:
-							moves.append(((target_piece_pos[0]+self.dir, target_piece_pos[1]), target_piece_pos))
+		# Make sure the en passant square is diagonally in front of the attacking pawn
+		if ep_square is not None and ep_square[0] == pos[0]+direction and abs(ep_square[1]-pos[1]) == 1:
+			target_piece_pos = (pos[0], ep_square[1])
+			if target_piece_pos in board and board[target_piece_pos].color != self.color:
+				if board[target_piece_pos].name == 'pawn':
+					moves.append((ep_square, target_piece_pos))
 
 		return moves
 
 
 class Rook(Piece):
 
-	def __init__(self, color):
-		super().__init__(color)
-		self.name = 'rook'
-		self.uni_char = '♖' if color == BLACK else '♜'
+	__slots__ = ()
+	kind = ROOK
+	name = 'rook'
+	white_char, black_char = '♜', '♖'
 
-	def available_moves(self, board, all_moves=None):
-		return self.collect_linear_moves(board, cardinals)
+	def available_moves(self, board, ep_square=None, castling=0):
+		return self.collect_linear_moves(board, rook_rays)
 
 
 class Knight(Piece):
 
-	def __init__(self, color):
-		super().__init__(color)
-		self.name = 'knight'
-		self.uni_char = '♘' if color == BLACK else '♞'
+	__slots__ = ()
+	kind = KNIGHT
+	name = 'knight'
+	white_char, black_char = '♞', '♘'
 
-	def available_moves(self, board, all_moves=None):
-		knight_list = ((-1,-2), (-2,-1), (-2,1), (-1,2), (1,-2), (2,-1), (2,1), (1,2))
-		return self.test_move_list(board, knight_list)
+	def available_moves(self, board, ep_square=None, castling=0):
+		return self.test_move_list(board, knight_targets)
 
 
 class Bishop(Piece):
 
-	def __init__(self, color):
-		super().__init__(color)
-		self.name = 'bishop'
-		self.uni_char = '♗' if color == BLACK else '♝'
+	__slots__ = ()
+	kind = BISHOP
+	name = 'bishop'
+	white_char, black_char = '♝', '♗'
 
-	def available_moves(self, board, all_moves=None):
-		return self.collect_linear_moves(board, diagonals)
+	def available_moves(self, board, ep_square=None, castling=0):
+		return self.collect_linear_moves(board, bishop_rays)
 
 
 class Queen(Piece):
 
-	def __init__(self, color):
-		super().__init__(color)
-		self.name = 'queen'
-		self.uni_char = '♕' if color == BLACK else '♛'
+	__slots__ = ()
+	kind = QUEEN
+	name = 'queen'
+	white_char, black_char = '♛', '♕'
 
-	def available_moves(self, board, all_moves=None):
-		return self.collect_linear_moves(board, cardinals + diagonals)
+	def available_moves(self, board, ep_square=None, castling=0):
+		return self.collect_linear_moves(board, queen_rays)
 
 
 class King(Piece):
 
-	def __init__(self, color):
-		super().__init__(color)
-		self.name = 'king'
-		self.uni_char = '♔' if color == BLACK else '♚'
+	__slots__ = ()
+	kind = KING
+	name = 'king'
+	white_char, black_char = '♚', '♔'
 
-	def available_moves(self, board, all_moves=None):
+	def available_moves(self, board, ep_square=None, castling=0):
 		# Returns a list of tuples of length 2
 		# The first item is the available move final position
 		# The second item is None for a normal move and the position the rook moves to for Castling moves
-		king_list = ((-1,0), (-1,1), (0,1), (1,1), (1,0), (1,-1), (0,-1), (-1,-1))
-		moves = self.test_move_list(board, king_list)
+		moves = self.test_move_list(board, king_targets)
 
 		# Castling
-		if len(self.pos_list) == 1:
-			castling_row = 0 if self.color == BLACK else 7
+		castling_row = 0 if self.color == BLACK else 7
+		kingside, queenside = (BLACK_KINGSIDE, BLACK_QUEENSIDE) if self.color == BLACK else \
+			(WHITE_KINGSIDE, WHITE_QUEENSIDE)
+		if castling & kingside and self.pos == (castling_row,4):
 			if (castling_row,5) not in board and (castling_row,6) not in board:
-				if (castling_row,7) in board and len(board[(castling_row,7)].pos_list) == 1:
+				if self.own_rook(board, (castling_row,7)):
 					moves.append(((castling_row,6), (castling_row,5)))
 
+		if castling & queenside and self.pos == (castling_row,4):
 			if (castling_row,3) not in board and (castling_row,2) not in board and (castling_row,1) not in board:
-				if (castling_row,0) in board and len(board[(castling_row,0)].pos_list) == 1:
+				if self.own_rook(board, (castling_row,0)):
 					moves.append(((castling_row,2), (castling_row,3)))
 
 		return moves
 
-def is_on_board(pos):
-	# Checks if a position is on the board
-	if pos[0] >= 0 and pos[0] <= 7 and pos[1] >= 0 and pos[1] <= 7:
-		return True
-	return False
+	def own_rook(self, board, pos):
+		# Checks if 'pos' holds a rook of the king's own color
+		if pos not in board:
+			return False
+		rook = board[pos]
+		return rook.name == 'rook' and rook.color == self.color
+
+promotion_pieces = {'queen':Queen, 'rook':Rook, 'bishop':Bishop, 'knight':Knight}
+fen_pieces = {'p':Pawn, 'n':Knight, 'b':Bishop, 'r':Rook, 'q':Queen, 'k':King}
+castling_chars = (('K', WHITE_KINGSIDE), ('Q', WHITE_QUEENSIDE), ('k', BLACK_KINGSIDE), ('q', BLACK_QUEENSIDE))
+piece_classes = (Pawn, Knight, Bishop, Rook, Queen, King)  # Indexed by piece kind
+# The king and rook squares each castling right needs
+castling_homes = ((WHITE_KINGSIDE, WHITE, (7,4), (7,7)), (WHITE_QUEENSIDE, WHITE, (7,4), (7,0)), \
+	(BLACK_KINGSIDE, BLACK, (0,4), (0,7)), (BLACK_QUEENSIDE, BLACK, (0,4), (0,0)))
+
+def valid_castling(board, castling):
+	# Returns the castling rights in 'castling' whose king and rook are on their home squares
+	for right, color, king_pos, rook_pos in castling_homes:
+		king, rook = board.get(king_pos), board.get(rook_pos)
+		if not (king and king.kind == KING and king.color == color and \
+			rook and rook.kind == ROOK and rook.color == color):
+			castling &= ~right
+	return castling
+
+# Binary position layout used by Chess.to_binary: occupancy mask, piece codes,
+# flags, en passant file + 1 (0 for none), halfmove clock, fullmove number
+position_struct = struct.Struct('<Q16sBBHH')
+POSITION_BYTES = position_struct.size
+
+def encode_positions(games):
+	# Packs the positions of many games into one bytes object, POSITION_BYTES each
+	return b''.join(game.to_binary() for game in games)
+
+def decode_positions(data, game=None):
+	# Yields each position packed by encode_positions. To avoid building a new object per
+	# position one game is reset to every position in turn and yielded each time,
+	# so use its copy method to keep a position.
+	if len(data) % POSITION_BYTES:
+		raise ValueError('Data is not a whole number of positions')
+	if game is None:
+		game = Chess()
+	for offset in range(0, len(data), POSITION_BYTES):
+		game.set_binary(data, offset)
+		yield game
+
+def decode_legal(game, code):
+	# Returns the legal move of the side to move that bitboard.encode_move packs to
+	# 'code', in the form taken by Chess.push, or None if there is none
+	return find_encoded(game.legal_moves(game.turn), code)
+
+def move_to_str(move):
+	# Converts a move to coordinate notation, e.g. 'e2e4' or 'e7e8q'
+	start, destination = move[0], move[1][0]
+	string = chr(start[1]+97) + str(8-start[0]) + chr(destination[1]+97) + str(8-destination[0])
+	if len(move) > 2:
+		string += 'n' if move[2] == 'knight' else move[2][0]
+	return string
 
 
 if __name__ == '__main__':
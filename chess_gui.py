@@ -1,13 +1,24 @@
 # Chess gui by Adam R. Smith
 
 import chess
+from book import OpeningBook
+from pawns import PawnTable
 
+import argparse
 import pygame
-import time
+import threading
 import random
 
 from pygame.locals import *
 
+# Posted by a timer when a timed message should be taken down
+HIDE_MSG = USEREVENT + 1
+# Posted by the engine thread with its chosen move and after each search depth
+ENGINE_MOVE = USEREVENT + 2
+ENGINE_PROGRESS = USEREVENT + 3
+
+ENGINE_HASH_MB = 16  # Size of the computer's transposition table, kept for the whole game
+
 # def random_game(smart=True, visual=False, time_step=0.2, promotion_piece='queen'):
 # 	'''
 # 	Play a random game.
@@ -64,11 +75,37 @@ from pygame.locals import *
 
 
 
+# Scaled piece images keyed by (piece, color, tile height)
+sprite_cache = {}
+
+def load_sprite(piece, color, height):
+	# Load a piece image scaled proportionally to a tile's height, once per piece and size
+
+	key = (piece, color, height)
+	if key not in sprite_cache:
+		scale_factor = 0.75
+		piece_img = pygame.image.load('chess_pieces/%s_%s.png' % (piece, color)).convert_alpha()
+		new_width = int(piece_img.get_width()*height/piece_img.get_height())
+		sprite_cache[key] = pygame.transform.smoothscale(piece_img,
+			(int(scale_factor*new_width), int(scale_factor*height)))
+	return sprite_cache[key]
+
+
 def main():
 	# The main program
 
+	parser = argparse.ArgumentParser(description='Play chess against another person or the computer')
+	parser.add_argument('--engine', choices=(chess.WHITE, chess.BLACK), \
+		help='let the computer play this colour')
+	parser.add_argument('--think', type=int, default=1000, metavar='MS', \
+		help='computer thinking time per move in milliseconds, 0 for the quick capture and check player (default 1000)')
+	parser.add_argument('--book', help='opening book for the computer, built with book.py')
+	args = parser.parse_args()
+
 	surface = create_window()
-	game = Game(surface)
+	game = Game(surface, args.engine, args.think)
+	if args.book:
+		game.engine.book = OpeningBook(args.book)
 	game.play()
 	pygame.quit()
 
@@ -83,6 +120,41 @@ def create_window():
 	return surface
 
 
+class EngineWorker(threading.Thread):
+	# Searches a snapshot of the game in the background and posts the chosen move as an
+	# ENGINE_MOVE event, so the window keeps drawing and responding while the computer thinks
+
+	def __init__(self, game, think_time):
+		threading.Thread.__init__(self, daemon=True)
+		self.snapshot = game.copy()
+		self.key = game.get_hash()  # Identifies the position the move was chosen for
+		self.think_time = think_time
+		self.cancelled = False
+
+	def run(self):
+		color = self.snapshot.get_turn()
+		if self.think_time:
+			result = self.snapshot.get_best_move(color, time_ms=self.think_time, on_iteration=self.progress)
+			move = result[0] if result else None
+		else:
+			move = self.snapshot.get_smart_move(color)
+		if not self.cancelled:
+			pygame.event.post(pygame.event.Event(ENGINE_MOVE, move=move, key=self.key))
+
+	def progress(self, depth, score, nodes, seconds, pv):
+		# Called by the search after each completed depth
+		if self.cancelled:
+			self.snapshot.stop_search()
+			return
+		pygame.event.post(pygame.event.Event(ENGINE_PROGRESS, depth=depth, nodes=nodes))
+
+	def cancel(self):
+		# Stop the search and wait for the thread to finish
+		self.cancelled = True
+		self.snapshot.stop_search()
+		self.join()
+
+
 class Tile:
 	# An object in this class represents a Rectangular tile
 
@@ -96,33 +168,19 @@ class Tile:
 		LIGHT = pygame.Color(162, 82, 80)
 		DARK = pygame.Color(242, 232, 231)
 		self.color = LIGHT if sum(pos) % 2 == 0 else DARK
-		self.img_names = {('pawn', 'white'):'chess_pieces/pawn_white.png',
-			('pawn', 'black'):'chess_pieces/pawn_black.png',
-			('rook', 'white'):'chess_pieces/rook_white.png',
-			('rook', 'black'):'chess_pieces/rook_black.png',
-			('knight', 'white'):'chess_pieces/knight_white.png',
-			('knight', 'black'):'chess_pieces/knight_black.png',
-			('bishop', 'white'):'chess_pieces/bishop_white.png',
-			('bishop', 'black'):'chess_pieces/bishop_black.png',
-			('queen', 'white'):'chess_pieces/queen_white.png',
-			('queen', 'black'):'chess_pieces/queen_black.png',
-			('king', 'white'):'chess_pieces/king_white.png',
-			('king', 'black'):'chess_pieces/king_black.png'}
 		self.highlighted = False
 		self.highlight_alpha = 100
 		self.highlight_color = (255, 0, 0)
+		self.highlight_surface = pygame.Surface((width, height))
+		self.highlight_surface.set_alpha(self.highlight_alpha)
+		self.highlight_surface.fill(self.highlight_color)
 
 	def draw(self, pos=None, piece=None, color=None):
 		# Draw a tile and its contents
 
 		pygame.draw.rect(self.surface, self.color, self.rect)
 		if pos:
-			# Load the piece image and scale it proportionally
-			scale_factor = 0.75
-			piece_img = pygame.image.load(self.img_names[(piece, color)])
-			new_width = int(piece_img.get_width()*self.height/piece_img.get_height())
-			piece_img = pygame.transform.smoothscale(piece_img,
-				(int(scale_factor*new_width), int(scale_factor*self.height)))
+			piece_img = load_sprite(piece, color, self.height)
 
 			# Draw the image in the center of the tile
 			center = (self.corner[0]+self.width//2, self.corner[1]+self.height//2)
@@ -131,10 +189,7 @@ class Tile:
 			self.surface.blit(piece_img, img_corner)
 
 		if self.highlighted:
-			highlight_surface = pygame.Surface((self.width, self.height))
-			highlight_surface.set_alpha(self.highlight_alpha)
-			highlight_surface.fill(self.highlight_color)
-			self.surface.blit(highlight_surface, self.corner)
+			self.surface.blit(self.highlight_surface, self.corner)
 
 	def clicked(self, pos):
 		# Determine if the position pos is within the current tile
@@ -144,21 +199,31 @@ class Tile:
 class Game:
 	# An object of this class represents a complete game
 
-	def __init__(self, surface):
+	def __init__(self, surface, engine_color=None, think_time=1000):
 		self.surface = surface
+		self.engine_color = engine_color  # Colour played by the computer, None for two players
+		self.think_time = think_time  # Milliseconds the computer searches for each move
+		self.worker = None  # The EngineWorker searching for the computer's move
 		self.close_clicked = False
 		self.continue_game = True
 		self.highlighted = None
 		self.board_size = 8
-		self.pause_time = 0.001
 		self.bg_color = pygame.Color('grey')
 		self.engine = chess.Chess()
+		if engine_color is not None:
+			# Made here so every snapshot searched by EngineWorker shares them between moves
+			self.engine.set_table_size(ENGINE_HASH_MB)
+			self.engine.pawn_table = PawnTable()
 		self.font_size = 50
 		self.font = 'freesansbold.ttf'
 		self.font_color = pygame.Color(0, 0, 255)
 		pygame.event.set_blocked(MOUSEMOTION)
 		self.end_msg = None
 		self.promotion_required = False
+		self.drawn = {}  # Contents of each tile as last drawn
+		self.dirty = set()  # Tiles to redraw regardless of their contents
+		self.overlays = {}  # Text drawn over the board, by name: (surface, corner)
+		self.overlays_drawn = set()
 		self.create_board()
 
 		font = pygame.font.Font(self.font, self.font_size)
@@ -190,50 +255,134 @@ class Game:
 	def play(self):
 		# Play the game
 
+		# Sleep until something happens, handle everything that is queued, then
+		# redraw whatever changed
 		self.draw()
+		self.start_engine()
 		while not self.close_clicked:
-			result = self.handle_event()
-			if result is not None:
-				self.handle_result(result[0], result[1])
-			self.draw_board()
-			if not self.continue_game:
-				msg = self.end_msg.upper() if self.end_msg == 'stalemate' else self.end_msg.upper() + ' WINS!'
-				self.display_msg(msg, pause_time=0)
-			if self.promotion_required:
-				self.display_promo()
-
-			pygame.display.update()
-			time.sleep(self.pause_time)
+			for event in [pygame.event.wait()] + pygame.event.get():
+				result = self.handle_event(event)
+				if result is not None:
+					self.handle_result(result[0], result[1])
+				if self.close_clicked:
+					break
+			self.start_engine()
+			self.update()
+		self.stop_engine()
+
+	def start_engine(self):
+		# Start the computer thinking if it is its turn and it is not already
+
+		if self.worker or not self.continue_game or self.promotion_required:
+			return
+		if self.engine.get_turn() != self.engine_color:
+			return
+		self.worker = EngineWorker(self.engine, self.think_time)
+		self.worker.start()
+		self.display_progress('THINKING...')
+
+	def stop_engine(self):
+		# Cancel a search in progress
+
+		if self.worker:
+			self.worker.cancel()
+			self.worker = None
+			self.hide_overlay('thinking')
 
 	def draw(self):
 		# Draw the game objects
 
+		self.drawn = {}
+		self.overlays_drawn = set()
 		self.draw_board()
+		self.draw_overlays([])
 		pygame.display.update()
 
+	def update(self):
+		# Redraw only what changed and pass just those areas to the display
+
+		rects = self.draw_board()
+		rects = self.draw_overlays(rects)
+		if rects:
+			pygame.display.update(rects)
+
 	def draw_board(self):
-		# Draw the board
+		# Draw the tiles whose piece or highlight changed and return their rects
 
 		chess_board = self.engine.get_board()
+		rects = []
 
 		for i, row in enumerate(self.board):
 			for j, tile in enumerate(row):
 				if (i,j) in chess_board:
-					tile.draw((i,j), chess_board[(i,j)].name, chess_board[(i,j)].color)
+					contents = (chess_board[(i,j)].name, chess_board[(i,j)].color)
+				else:
+					contents = None
+				if (i,j) in self.drawn and self.drawn[(i,j)] == contents and (i,j) not in self.dirty:
+					continue
+				if contents:
+					tile.draw((i,j), contents[0], contents[1])
 				else:
 					tile.draw()
+				self.drawn[(i,j)] = contents
+				rects.append(tile.rect)
 
-	def handle_event(self):
-		# Handle each user event by changing the game state appropriately.
+		self.dirty.clear()
+		return rects
 
-		for event in pygame.event.get():
-			if event.type == QUIT:
-				self.close_clicked = True
+	def draw_overlays(self, rects):
+		# Draw overlays that are new or whose tiles were just redrawn and add their rects
+
+		for name, (surface, corner) in self.overlays.items():
+			rect = pygame.Rect(corner, surface.get_size())
+			if name not in self.overlays_drawn or rect.collidelist(rects) != -1:
+				self.surface.blit(surface, corner)
+				self.overlays_drawn.add(name)
+				rects.append(rect)
+		return rects
+
+	def show_overlay(self, name, surface, corner):
+		# Keep 'surface' drawn over the board until hide_overlay is called
+
+		self.overlays[name] = (surface, corner)
+		self.overlays_drawn.discard(name)
+
+	def hide_overlay(self, name):
+		# Remove an overlay and redraw the tiles beneath it
+
+		if name not in self.overlays:
+			return
+		surface, corner = self.overlays.pop(name)
+		self.overlays_drawn.discard(name)
+		self.mark_dirty(pygame.Rect(corner, surface.get_size()))
+
+	def mark_dirty(self, rect):
+		# Redraw every tile overlapping 'rect' on the next update
+
+		for row in self.board:
+			for tile in row:
+				if tile.rect.colliderect(rect):
+					self.dirty.add(tile.pos)
+
+	def handle_event(self, event):
+		# Handle a user or timer event by changing the game state appropriately.
+
+		if event.type == QUIT:
+			self.close_clicked = True
+		elif event.type == HIDE_MSG:
+			self.hide_overlay('msg')
+		elif event.type == VIDEOEXPOSE:
+			self.draw()
+		elif event.type == ENGINE_PROGRESS and self.worker:
+			self.display_progress('THINKING... DEPTH %d' % event.depth)
+		elif event.type == ENGINE_MOVE:
+			return self.handle_engine_move(event)
+		elif event.type == MOUSEBUTTONUP and self.continue_game:
+			if self.engine.get_turn() == self.engine_color:
 				return None
-			elif event.type == MOUSEBUTTONUP and self.continue_game:
-				if not self.promotion_required:
-					return self.handle_mouse_up(event)
-				self.handle_mouse_up_promo(event)
+			if not self.promotion_required:
+				return self.handle_mouse_up(event)
+			return self.handle_mouse_up_promo(event)
 
 	def handle_mouse_up(self, event):
 		# Handle a click on the board
@@ -245,9 +394,11 @@ class Game:
 					if self.highlighted:
 						if tile.highlighted:
 							tile.highlighted = False
+							self.dirty.add(tile.pos)
 							self.highlighted = None
 							return None
 						self.board[self.highlighted[0]][self.highlighted[1]].highlighted = False
+						self.dirty.add(self.highlighted)
 						move = (self.highlighted, tile.pos)
 						self.highlighted = None
 						_, result, msg = self.engine.play_turn(move)
@@ -256,6 +407,7 @@ class Game:
 						if self.engine.get_board()[tile.pos].color == self.engine.get_turn():
 							self.highlighted = tile.pos
 							tile.highlighted = True
+							self.dirty.add(tile.pos)
 					return None
 
 	def handle_mouse_up_promo(self, event):
@@ -268,6 +420,32 @@ class Game:
 		if promo_piece:
 			self.engine.play_turn(move=None, promotion=promo_piece)
 			self.promotion_required = False
+			for i in range(len(self.promo_surfaces)):
+				self.hide_overlay('promo%d' % i)
+			return self.promotion_result()
+
+	def handle_engine_move(self, event):
+		# Play the move chosen by the engine thread
+
+		self.worker = None
+		self.hide_overlay('thinking')
+		if event.move is None or event.key != self.engine.get_hash() or not self.continue_game:
+			return None
+		_, result, msg = self.engine.play_turn(event.move[:2])
+		if result == 4:
+			self.engine.play_turn(None, event.move[2] if len(event.move) > 2 else 'queen')
+			return self.promotion_result()
+		return (result, msg)
+
+	def promotion_result(self):
+		# play_turn does not look for mate or stalemate after a promotion, so check here
+
+		turn = self.engine.get_turn()
+		if self.engine.has_move(turn):
+			return None
+		if self.engine.is_in_check(turn):
+			return (1, chess.WHITE if turn == chess.BLACK else chess.BLACK)
+		return (2, 'stalemate')
 
 	def handle_result(self, result, msg):
 		# Handle the result of a move
@@ -280,12 +458,16 @@ class Game:
 			raise RuntimeError('Error decoding move input')
 		elif result == 4:
 			self.promotion_required = True
+			self.display_promo()
 		elif result in (1, 2):
 			self.continue_game = False
 			self.end_msg = msg
+			msg = self.end_msg.upper() if self.end_msg == 'stalemate' else self.end_msg.upper() + ' WINS!'
+			self.display_msg(msg, pause_time=0)
 
 	def display_msg(self, msg, pause_time=0.75):
-		# Briefly display a message on the screen
+		# Display a message on the screen, taken down by a timer after pause_time
+		# seconds or kept until the game is closed if pause_time is 0
 
 		font = pygame.font.Font(self.font, self.font_size)
 		str_surface = font.render(msg, True, self.font_color)
@@ -293,16 +475,22 @@ class Game:
 		width = str_surface.get_width()
 		height = str_surface.get_height()
 		str_corner = (self.surface.get_width()//2 - width//2, self.surface.get_height()//2 - height//2)
-		self.surface.blit(str_surface, str_corner)
-		if pause_time:
-			pygame.display.update()
-			time.sleep(pause_time)
+		self.hide_overlay('msg')
+		self.show_overlay('msg', str_surface, str_corner)
+		pygame.time.set_timer(HIDE_MSG, int(pause_time*1000), 1)
+
+	def display_progress(self, msg):
+		# Show what the computer is doing in the corner of the board
+
+		font = pygame.font.Font(self.font, self.font_size//3)
+		self.hide_overlay('thinking')
+		self.show_overlay('thinking', font.render(msg, True, self.font_color), (5, 5))
 
 	def display_promo(self):
 		# Display the options for pawn promotion
 
 		for i, surf in enumerate(self.promo_surfaces):
-			self.surface.blit(surf, self.promo_locs[i])
+			self.show_overlay('promo%d' % i, surf, self.promo_locs[i])
 
 
 if __name__ == '__main__':
@@ -0,0 +1,191 @@
+# Static evaluation with material and piece-square tables
+#
+# evaluate scores one Chess position and is the fast path used by the search. It reads
+# Chess.score, which the board primitives (place_piece, remove_piece and the two move
+# functions) update with the SQUARE_SCORES of each piece they touch. Those primitives
+# are also where the features of an incrementally updated network evaluation would be
+# added and removed. The pawn structure score from pawns.py is added on top, cached by
+# the search under the pawns' hash.
+#
+# The batch functions score the material and piece squares of many positions at once
+# with NumPy, for offline analysis:
+#
+#	codes = codes_from_binary(data)[0]    # Positions packed by chess.encode_positions
+#	scores = evaluate_codes(codes)        # One score per position, from white's side
+#
+# A position is 64 piece codes in square order (a8 first): 0 for an empty square,
+# 1 to 6 for a white pawn to king and 7 to 12 for a black pawn to king, the same
+# codes as Chess.to_binary. NumPy is only needed for the batch functions.
+
+from bitboard import KING, lsb
+from pawns import pawn_structure
+from zobrist import PIECE_KEYS
+
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+# Centipawn values indexed by piece kind (pawn, knight, bishop, rook, queen, king)
+PIECE_VALUES = (100, 320, 330, 500, 900, 0)
+
+# Piece-square bonuses for white in square order, a8 first, indexed by piece kind.
+# Black uses the same tables mirrored top to bottom.
+PIECE_SQUARE_TABLES = (
+	(  0,   0,   0,   0,   0,   0,   0,   0,
+	  50,  50,  50,  50,  50,  50,  50,  50,
+	  10,  10,  20,  30,  30,  20,  10,  10,
+	   5,   5,  10,  25,  25,  10,   5,   5,
+	   0,   0,   0,  20,  20,   0,   0,   0,
+	   5,  -5, -10,   0,   0, -10,  -5,   5,
+	   5,  10,  10, -20, -20,  10,  10,   5,
+	   0,   0,   0,   0,   0,   0,   0,   0),
+	(-50, -40, -30, -30, -30, -30, -40, -50,
+	 -40, -20,   0,   0,   0,   0, -20, -40,
+	 -30,   0,  10,  15,  15,  10,   0, -30,
+	 -30,   5,  15,  20,  20,  15,   5, -30,
+	 -30,   0,  15,  20,  20,  15,   0, -30,
+	 -30,   5,  10,  15,  15,  10,   5, -30,
+	 -40, -20,   0,   5,   5,   0, -20, -40,
+	 -50, -40, -30, -30, -30, -30, -40, -50),
+	(-20, -10, -10, -10, -10, -10, -10, -20,
+	 -10,   0,   0,   0,   0,   0,   0, -10,
+	 -10,   0,   5,  10,  10,   5,   0, -10,
+	 -10,   5,   5,  10,  10,   5,   5, -10,
+	 -10,   0,  10,  10,  10,  10,   0, -10,
+	 -10,  10,  10,  10,  10,  10,  10, -10,
+	 -10,   5,   0,   0,   0,   0,   5, -10,
+	 -20, -10, -10, -10, -10, -10, -10, -20),
+	(  0,   0,   0,   0,   0,   0,   0,   0,
+	   5,  10,  10,  10,  10,  10,  10,   5,
+	  -5,   0,   0,   0,   0,   0,   0,  -5,
+	  -5,   0,   0,   0,   0,   0,   0,  -5,
+	  -5,   0,   0,   0,   0,   0,   0,  -5,
+	  -5,   0,   0,   0,   0,   0,   0,  -5,
+	  -5,   0,   0,   0,   0,   0,   0,  -5,
+	   0,   0,   0,   5,   5,   0,   0,   0),
+	(-20, -10, -10,  -5,  -5, -10, -10, -20,
+	 -10,   0,   0,   0,   0,   0,   0, -10,
+	 -10,   0,   5,   5,   5,   5,   0, -10,
+	  -5,   0,   5,   5,   5,   5,   0,  -5,
+	   0,   0,   5,   5,   5,   5,   0,  -5,
+	 -10,   5,   5,   5,   5,   5,   0, -10,
+	 -10,   0,   5,   0,   0,   0,   0, -10,
+	 -20, -10, -10,  -5,  -5, -10, -10, -20),
+	(-30, -40, -40, -50, -50, -40, -40, -30,
+	 -30, -40, -40, -50, -50, -40, -40, -30,
+	 -30, -40, -40, -50, -50, -40, -40, -30,
+	 -30, -40, -40, -50, -50, -40, -40, -30,
+	 -20, -30, -30, -40, -40, -30, -30, -20,
+	 -10, -20, -20, -20, -20, -20, -20, -10,
+	  20,  20,   0,   0,   0,   0,  20,  20,
+	  20,  30,  10,   0,   0,  10,  30,  20),
+)
+
+# Material plus piece-square bonus for each side, kind and square, negated for black
+# so that a position's score from white's side is the sum over its pieces
+SQUARE_SCORES = (
+	tuple(tuple(PIECE_VALUES[kind] + PIECE_SQUARE_TABLES[kind][sq] for sq in range(64)) \
+		for kind in range(6)),
+	tuple(tuple(-PIECE_VALUES[kind] - PIECE_SQUARE_TABLES[kind][sq ^ 56] for sq in range(64)) \
+		for kind in range(6)),
+)
+
+# Layout of chess.position_struct: a 64-bit occupancy mask, 16 bytes of piece codes,
+# the flags byte with the side to move in bit 0, then fields not needed here
+BINARY_BYTES = 30
+
+# SQUARE_SCORES indexed by piece code, with a row of zeros for empty squares
+CODE_SCORES = ((0,) * 64,) + SQUARE_SCORES[0] + SQUARE_SCORES[1]
+
+
+def evaluate(game, pawn_table=None):
+	# Material, piece-square and pawn structure score in centipawns from the point of view
+	# of the side to move. The pawn structure is looked up in 'pawn_table' if one is given.
+	pieces = game.bitboards.pieces
+	if pawn_table is None:
+		score = game.score + pawn_structure(pieces)
+	else:
+		key = game.pawn_hash ^ PIECE_KEYS[0][KING][lsb(pieces[0][KING])] ^ \
+			PIECE_KEYS[1][KING][lsb(pieces[1][KING])]
+		score = game.score + pawn_table.score(key, pieces)
+	return score if game.turn == 'white' else -score
+
+
+def board_score(board):
+	# Computes the material and piece-square score of a Chess.board for white from scratch
+	score = 0
+	for (row, col), piece in board.items():
+		score += SQUARE_SCORES[0 if piece.color == 'white' else 1][piece.kind][row*8 + col]
+	return score
+
+
+def piece_codes(game):
+	# Returns the 64 piece codes of a Chess position as bytes
+	codes = bytearray(64)
+	for (row, col), piece in game.board.items():
+		codes[row*8 + col] = piece.kind + (1 if piece.color == 'white' else 7)
+	return bytes(codes)
+
+
+def require_numpy():
+	if np is None:
+		raise ImportError('NumPy is required for batch evaluation')
+
+
+def code_array(games):
+	# Returns the positions of an iterable of Chess objects as an (N, 64) array of piece codes
+	require_numpy()
+	data = b''.join(piece_codes(game) for game in games)
+	return np.frombuffer(data, dtype=np.uint8).reshape(-1, 64)
+
+
+def codes_from_binary(data):
+	# Unpacks positions packed by chess.encode_positions without building Chess objects.
+	# Returns an (N, 64) array of piece codes and an (N,) array of the side to move
+	# (0 for white, 1 for black).
+	require_numpy()
+	records = np.frombuffer(data, dtype=np.uint8).reshape(-1, BINARY_BYTES)
+	occupied = np.unpackbits(records[:, 0:8], axis=1, bitorder='little').astype(bool)
+	packed = records[:, 8:24]
+	nibbles = np.empty((len(records), 32), dtype=np.uint8)
+	nibbles[:, 0::2] = packed & 15
+	nibbles[:, 1::2] = packed >> 4
+	# The n'th occupied square holds the n'th code
+	index = np.cumsum(occupied, axis=1) - 1
+	codes = np.where(occupied, np.take_along_axis(nibbles, np.clip(index, 0, 31), axis=1), 0)
+	return codes.astype(np.uint8), records[:, 24] & 1
+
+
+def code_planes(codes):
+	# Converts an (N, 64) array of piece codes to (N, 12, 64) one-hot planes, one per
+	# piece code from 1 to 12
+	require_numpy()
+	codes = np.asarray(codes)
+	return (codes[:, None, :] == np.arange(1, 13, dtype=codes.dtype)[None, :, None]).astype(np.int8)
+
+
+def score_tables():
+	# Returns CODE_SCORES as a (13, 64) int32 array
+	require_numpy()
+	return np.array(CODE_SCORES, dtype=np.int32)
+
+
+def evaluate_codes(codes, turns=None):
+	# Scores an (N, 64) array of piece codes with one gather from the score table.
+	# Scores are from white's point of view, or the side to move's if 'turns' holds
+	# the side to move of each position (0 for white, 1 for black).
+	require_numpy()
+	codes = np.asarray(codes)
+	scores = score_tables()[codes, np.arange(64)].sum(axis=1, dtype=np.int32)
+	return scores if turns is None else np.where(np.asarray(turns) == 0, scores, -scores)
+
+
+def evaluate_planes(planes, turns=None):
+	# Scores an (N, 12, 64) array of one-hot planes with one matrix product. Scores are
+	# from white's point of view, or the side to move's as in evaluate_codes.
+	require_numpy()
+	planes = np.asarray(planes)
+	weights = score_tables()[1:].reshape(12*64)
+	scores = planes.reshape(len(planes), 12*64).astype(np.int32) @ weights
+	return scores if turns is None else np.where(np.asarray(turns) == 0, scores, -scores)
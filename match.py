@@ -0,0 +1,260 @@
+# Engine against engine match runner with a sequential probability ratio test
+#
+# Usage:
+#	python match.py --engine1 smart --engine2 random --games 100
+#	python match.py --engine1 search:time=100 --engine2 search:time=100,depth=3 --sprt 0 10
+#	python match.py --engine1 search:nodes=4000 --engine2 search:nodes=2000 --openings book.pgn
+#	python match.py --engine1 search:time=50 --engine2 search:time=50,null=0 --sprt -10 0
+#
+# An engine is 'random', 'smart' or 'search' followed by optional settings after a
+# colon: time (milliseconds per move), depth, nodes and hash (megabytes). null, lmr
+# and futility set to 0 switch off null move pruning, late move reductions and
+# futility pruning.
+# Each opening is played twice with colours reversed. Games run on a process pool
+# and the match stops early once the SPRT accepts one of its hypotheses.
+# Results, Elo and the test are reported from the point of view of engine1.
+
+import argparse
+import functools
+import math
+import multiprocessing
+import random
+import sys
+import time
+
+from chess import Chess
+from transposition import TranspositionTable
+from selfplay import find_public_move, termination, TERMINATIONS, CHECKMATE
+
+# Short, roughly balanced openings in coordinate notation
+OPENINGS = (
+	'e2e4 e7e5 g1f3 b8c6',
+	'e2e4 c7c5 g1f3 d7d6',
+	'e2e4 e7e6 d2d4 d7d5',
+	'e2e4 c7c6 d2d4 d7d5',
+	'e2e4 d7d6 d2d4 g8f6',
+	'd2d4 d7d5 c2c4 e7e6',
+	'd2d4 d7d5 c2c4 c7c6',
+	'd2d4 g8f6 c2c4 g7g6',
+	'd2d4 g8f6 c2c4 e7e6',
+	'd2d4 f7f5 g2g3 g8f6',
+	'c2c4 e7e5 b1c3 g8f6',
+	'c2c4 c7c5 g1f3 b8c6',
+	'g1f3 d7d5 g2g3 g8f6',
+	'g1f3 g8f6 c2c4 b7b6',
+	'b2b3 e7e5 c1b2 b8c6',
+	'e2e4 g7g6 d2d4 f8g7',
+)
+
+SETTINGS = {'time':'time_ms', 'depth':'depth', 'nodes':'nodes', 'hash':'hash_mb'}
+SWITCHES = {'null':'null_move', 'lmr':'lmr', 'futility':'futility'}  # Keys of Chess.search_settings
+
+
+def parse_engine(spec):
+	# Converts 'search:time=100,depth=4' style strings to a settings dictionary
+	policy, _, settings = spec.partition(':')
+	if policy not in ('random', 'smart', 'search'):
+		raise ValueError('Unknown engine: ' + spec)
+	engine = {'name':spec, 'policy':policy, 'time_ms':None, 'depth':None, 'nodes':None, 'hash_mb':4, \
+		'search_settings':{}}
+	for setting in filter(None, settings.split(',')):
+		name, _, value = setting.partition('=')
+		if name in SWITCHES:
+			engine['search_settings'][SWITCHES[name]] = bool(int(value))
+		elif name in SETTINGS:
+			engine[SETTINGS[name]] = int(value)
+		else:
+			raise ValueError('Unknown engine setting: ' + name)
+	if policy == 'search' and not (engine['time_ms'] or engine['depth'] or engine['nodes']):
+		engine['time_ms'] = 100
+	return engine
+
+
+def opening_fen(line):
+	# Returns the FEN reached by a line of coordinate moves
+	game = Chess()
+	for string in line.split():
+		move = game.find_move(string)
+		if move is None:
+			raise ValueError('Illegal move %s in opening %s' % (string, line))
+		game.push(move)
+	return game.to_fen()
+
+
+def load_openings(path=None):
+	# Returns the starting FENs of the match: the built-in openings, the final positions
+	# of the games in a PGN file, or one FEN or EPD position per line of a text file
+	if path is None:
+		return [opening_fen(line) for line in OPENINGS]
+	if path.endswith('.pgn'):
+		from pgn import read_file
+		return [game.end().to_fen() for game in read_file(path)]
+	fens = []
+	with open(path) as stream:
+		for line in stream:
+			fields = line.split()
+			if len(fields) < 4:
+				continue
+			if len(fields) < 6 or not (fields[4].isdigit() and fields[5].isdigit()):
+				fields = fields[:4] + ['0', '1']  # EPD operations instead of move counters
+			fens.append(Chess.from_fen(' '.join(fields[:6])).to_fen())
+	return fens
+
+
+def engine_move(game, engine, table, rng):
+	# Returns the move chosen by 'engine' in the form taken by Chess.push
+	if engine['policy'] == 'random':
+		return rng.choice(game.legal_moves(game.turn))
+	if engine['policy'] == 'smart':
+		return find_public_move(game, *game.get_smart_move(game.turn))
+	game.transposition_table = table  # Each engine keeps its own table through the game
+	game.search_settings = engine['search_settings']
+	move = game.get_best_move(game.turn, engine['time_ms'], engine['depth'], engine['nodes'])[0]
+	return find_public_move(game, *move)
+
+
+def play_game(index, fens, first, second, seed=0, max_plies=400):
+	# Plays game 'index' of the match and returns (index, score of first, termination, plies).
+	# Game 2n and 2n+1 start from opening n, with the first engine playing white in game 2n.
+	rng = random.Random(seed + index)
+	random.seed(seed + index)
+	game = Chess.from_fen(fens[(index // 2) % len(fens)])
+	engines = (first, second) if index % 2 == 0 else (second, first)
+	tables = [TranspositionTable(engine['hash_mb']) if engine['policy'] == 'search' else None \
+		for engine in engines]
+	first_color = game.turn if index % 2 == 0 else ('black' if game.turn == 'white' else 'white')
+	mover = 0  # Index into engines of the side to move
+	seen = {game.hash: 1}
+	plies = 0
+
+	while True:
+		end = termination(game, seen, plies, max_plies)
+		if end == CHECKMATE:
+			return (index, 0.0 if game.turn == first_color else 1.0, end, plies)
+		if end is not None:
+			return (index, 0.5, end, plies)  # Games reaching the move limit are adjudicated as draws
+
+		game.push(engine_move(game, engines[mover], tables[mover], rng))
+		seen[game.hash] = seen.get(game.hash, 0) + 1
+		mover ^= 1
+		plies += 1
+
+
+def expected_score(elo):
+	return 1 / (1 + 10 ** (-elo / 400))
+
+
+def elo_difference(score):
+	return -400 * math.log10(1 / score - 1)
+
+
+def score_stats(wins, draws, losses):
+	# Returns the mean score per game and its variance, with half a win, draw and loss
+	# added to the counts so that one-sided and all-draw results have a non-zero variance
+	wins, draws, losses = wins + 0.5, draws + 0.5, losses + 0.5
+	games = wins + draws + losses
+	score = (wins + draws / 2) / games
+	return (score, (wins + draws / 4) / games - score ** 2)
+
+
+def elo_estimate(wins, draws, losses):
+	# Returns (Elo difference, 95% error margin) from a win, draw and loss count. The
+	# score is kept away from 0 and 1 so that one-sided results give a finite estimate.
+	games = wins + draws + losses
+	limit = 0.5 / (games + 1)
+	score = min(max((wins + draws / 2) / games, limit), 1 - limit)
+	deviation = math.sqrt(score_stats(wins, draws, losses)[1] / games)
+	low = min(max(score - 1.96 * deviation, 1e-6), 1 - 1e-6)
+	high = min(max(score + 1.96 * deviation, 1e-6), 1 - 1e-6)
+	return (elo_difference(score), (elo_difference(high) - elo_difference(low)) / 2)
+
+
+def sprt_llr(wins, draws, losses, elo0, elo1):
+	# Log likelihood ratio of H1 (Elo difference elo1) against H0 (elo0), using the
+	# normal approximation of the score distribution
+	games = wins + draws + losses
+	if not games:
+		return 0.0
+	score, variance = score_stats(wins, draws, losses)
+	score0, score1 = expected_score(elo0), expected_score(elo1)
+	return (score1 - score0) * (2 * score - score0 - score1) * games / (2 * variance)
+
+
+def sprt_bounds(alpha, beta):
+	return (math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha))
+
+
+def run_match(first, second, games, fens, processes=None, sprt=None, alpha=0.05, beta=0.05, \
+	seed=0, max_plies=400, out=sys.stdout):
+	# Plays up to 'games' games and returns (wins, draws, losses) for the first engine.
+	# 'sprt' is an (elo0, elo1) pair; the match stops once the test accepts either.
+	task = functools.partial(play_game, fens=fens, first=first, second=second, seed=seed, \
+		max_plies=max_plies)
+	wins = draws = losses = 0
+	terminations = [0] * len(TERMINATIONS)
+	lower, upper = sprt_bounds(alpha, beta)
+	start = time.perf_counter()
+
+	with multiprocessing.Pool(processes) as pool:
+		for index, score, termination, plies in pool.imap_unordered(task, range(games)):
+			if score == 1.0:
+				wins += 1
+			elif score == 0.0:
+				losses += 1
+			else:
+				draws += 1
+			terminations[termination] += 1
+			played = wins + draws + losses
+			line = '%d games +%d =%d -%d' % (played, wins, draws, losses)
+			if sprt:
+				llr = sprt_llr(wins, draws, losses, sprt[0], sprt[1])
+				line += '  LLR %.2f (%.2f, %.2f)' % (llr, lower, upper)
+				if llr <= lower or llr >= upper:
+					out.write(line + '\n')
+					out.write('SPRT: H%d accepted\n' % (1 if llr >= upper else 0))
+					pool.terminate()
+					break
+			out.write(line + '\r')
+			out.flush()
+
+	played = wins + draws + losses
+	out.write('\n%s vs %s: %d games in %.1fs\n' % (first['name'], second['name'], played, \
+		time.perf_counter() - start))
+	out.write('Score +%d =%d -%d' % (wins, draws, losses))
+	if played:
+		elo, margin = elo_estimate(wins, draws, losses)
+		out.write(', Elo difference %.1f +/- %.1f' % (elo, margin))
+	out.write('\n' + ', '.join('%s %d' % (name, count) for name, count in \
+		zip(TERMINATIONS, terminations) if count) + '\n')
+	return (wins, draws, losses)
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Play two engine configurations against each other')
+	parser.add_argument('--engine1', default='smart', help='engine being tested (default smart)')
+	parser.add_argument('--engine2', default='random', help='reference engine (default random)')
+	parser.add_argument('--games', type=int, default=100, help='maximum number of games (default 100)')
+	parser.add_argument('--openings', help='PGN file, or file with one FEN per line, of starting positions')
+	parser.add_argument('--sprt', type=float, nargs=2, metavar=('ELO0', 'ELO1'), \
+		help='stop once the SPRT accepts an Elo difference of ELO0 or ELO1')
+	parser.add_argument('--alpha', type=float, default=0.05, help='SPRT false positive rate')
+	parser.add_argument('--beta', type=float, default=0.05, help='SPRT false negative rate')
+	parser.add_argument('--max-plies', type=int, default=400, help='adjudicate longer games as draws')
+	parser.add_argument('--seed', type=int, default=0, help='seed for the random and smart engines')
+	parser.add_argument('--processes', type=int, help='worker processes (default one per core)')
+	args = parser.parse_args(argv)
+
+	try:
+		first, second = parse_engine(args.engine1), parse_engine(args.engine2)
+	except ValueError as error:
+		parser.error(str(error))
+	fens = load_openings(args.openings)
+	if not fens:
+		parser.error('No openings found')
+	run_match(first, second, args.games, fens, args.processes, args.sprt, args.alpha, args.beta, \
+		args.seed, args.max_plies)
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
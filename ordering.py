@@ -0,0 +1,162 @@
+# Move ordering for the search engine
+
+from bitboard import PAWN, QUEEN, TACTICAL, QUIET, COLOR_INDEX, encode_move, find_encoded
+
+# Piece values used to rank captures, indexed by piece kind. As an attacker the king
+# is worth more than everything else so its captures are tried last among equal victims.
+VICTIM_VALUES = (100, 320, 330, 500, 900, 0)
+ATTACKER_VALUES = (100, 320, 330, 500, 900, 20000)
+
+
+class MoveOrdering:
+	# Orders the moves of each node: the principal variation and transposition table
+	# moves, then captures by most valuable victim and least valuable attacker, then
+	# the killer moves of the ply, then quiet moves by their history score, and finally
+	# captures that lose material. Quiet moves are only generated once they are needed.
+
+	def __init__(self, max_ply, see=None):
+		self.max_ply = max_ply
+		self.see = see  # Exchange evaluator see(bitboards, from_sq, to_sq), if any
+		self.killers = [[0, 0] for _ in range(max_ply+1)]  # Two quiet cutoff moves per ply
+		self.history = [0] * (2*4096)  # Indexed by side, start square and destination square
+		self.reset_stats()
+
+	def reset_stats(self):
+		self.nodes = 0  # Nodes whose moves were ordered
+		self.quiet_generations = 0  # Nodes that had to generate their quiet moves
+		self.cutoffs = 0  # Nodes that failed high
+		self.first_move_cutoffs = 0  # Nodes that failed high on the first move searched
+
+	def new_search(self):
+		# Keep what was learnt by earlier searches but let new results count for more
+		self.killers = [[0, 0] for _ in range(self.max_ply+1)]
+		self.history = [value // 8 for value in self.history]
+
+	def capture_score(self, game, move):
+		# Most valuable victim, least valuable attacker. Promotions count the piece gained.
+		board = game.board
+		attacker = board[move[0]].kind
+		destination = move[1][0]
+		if destination in board:
+			score = VICTIM_VALUES[board[destination].kind] * 16
+		elif move[1][1]:
+			score = VICTIM_VALUES[PAWN] * 16  # En passant
+		else:
+			score = 0
+		if len(move) > 2:
+			score += (VICTIM_VALUES[QUEEN] - VICTIM_VALUES[PAWN]) * 16 if move[2] == 'queen' else -1
+		return score - ATTACKER_VALUES[attacker] // 100
+
+	def is_losing(self, game, move):
+		# Whether a capture loses material, tested only when the attacker is worth more
+		# than its victim since anything else cannot lose
+		if self.see is None or len(move) > 2:
+			return len(move) > 2 and move[2] != 'queen'  # Underpromotions go last
+		board = game.board
+		destination = move[1][0]
+		if destination not in board:
+			return False
+		if ATTACKER_VALUES[board[move[0]].kind] <= VICTIM_VALUES[board[destination].kind]:
+			return False
+		start = move[0]
+		return self.see(game.bitboards, start[0]*8 + start[1], destination[0]*8 + destination[1]) < 0
+
+	def moves(self, game, ply, first=()):
+		# Yields the legal moves of the side to move in the order they should be searched.
+		# 'first' holds encoded moves to try before everything else, such as the previous
+		# principal variation move and the transposition table move. The game must be back
+		# in the same position each time the next move is taken.
+		self.nodes += 1
+		color = game.turn
+		tactical = game.legal_moves(color, TACTICAL)
+		quiet = None
+		done = set()
+
+		for code in first:
+			if not code or code in done:
+				continue
+			move = find_encoded(tactical, code)
+			if move is None:
+				if quiet is None:
+					quiet = game.legal_moves(color, QUIET)
+					self.quiet_generations += 1
+				move = find_encoded(quiet, code)
+				if move is None:
+					continue  # Not legal here, e.g. a transposition table collision
+			done.add(code)
+			yield move
+
+		# Captures and promotions
+		scored = []
+		losing = []
+		for move in tactical:
+			code = encode_move(move)
+			if code in done:
+				continue
+			if self.is_losing(game, move):
+				losing.append(move)
+			else:
+				scored.append((self.capture_score(game, move), code, move))
+		scored.sort(reverse=True)
+		for _, code, move in scored:
+			done.add(code)
+			yield move
+
+		if quiet is None:
+			quiet = game.legal_moves(color, QUIET)
+			self.quiet_generations += 1
+
+		# Killer moves, which caused cutoffs in sibling nodes
+		for killer in self.killers[ply]:
+			if not killer or killer in done:
+				continue
+			move = find_encoded(quiet, killer)
+			if move is not None:
+				done.add(killer)
+				yield move
+
+		# Remaining quiet moves by history score
+		history = self.history
+		side = COLOR_INDEX[color] << 12
+		scored = []
+		for move in quiet:
+			code = encode_move(move)
+			if code not in done:
+				scored.append((history[side | code & 4095], code, move))
+		scored.sort(reverse=True)
+		for _, _, move in scored:
+			yield move
+
+		for move in losing:
+			yield move
+
+	def is_quiet(self, game, move):
+		return len(move) == 2 and move[1][0] not in game.board and \
+			not (move[1][1] and game.board[move[0]].kind == PAWN)
+
+	def record_cutoff(self, game, move, ply, depth, move_number):
+		# Called with the game at the node's position when 'move', the move_number'th
+		# (from 0) move searched there, fails high
+		self.cutoffs += 1
+		if move_number == 0:
+			self.first_move_cutoffs += 1
+		if not self.is_quiet(game, move):
+			return
+		code = encode_move(move)
+		killers = self.killers[ply]
+		if killers[0] != code:
+			killers[1] = killers[0]
+			killers[0] = code
+		index = COLOR_INDEX[game.turn] << 12 | code & 4095
+		self.history[index] += depth * depth
+		if self.history[index] > 1 << 20:
+			self.history = [value // 2 for value in self.history]
+
+	def first_move_cutoff_rate(self):
+		# Fraction of cutoffs caused by the first move; close to 1 means a nearly minimal tree
+		return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+	def stats(self):
+		return {'ordered_nodes':self.nodes, 'quiet_generations':self.quiet_generations, \
+			'cutoffs':self.cutoffs, 'first_move_cutoffs':self.first_move_cutoffs, \
+			'first_move_cutoff_rate':self.first_move_cutoff_rate()}
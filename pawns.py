@@ -0,0 +1,101 @@
+# Pawn structure evaluation and its hash table
+
+from array import array
+
+from bitboard import BIT, PAWN, KING, lsb, popcount
+from transposition import HashTable
+
+ENTRY_BYTES = 12  # One 64-bit key and one 32-bit score
+
+# Centipawn weights of the pawn structure terms
+DOUBLED_PAWN = -10  # For each pawn behind another of its side on the same file
+ISOLATED_PAWN = -15  # For each pawn with no pawns of its side on the neighbouring files
+PASSED_PAWN = (0, 10, 15, 25, 40, 65, 100, 0)  # Indexed by rows advanced from the starting side
+SHIELD_PAWN = (10, 5)  # For each pawn one and two rows in front of its king, on the king's files
+
+
+def _file_mask(col):
+	return sum(BIT[row*8 + col] for row in range(8))
+
+
+FILE_MASKS = [_file_mask(col) for col in range(8)]
+NEIGHBOUR_FILES = [(FILE_MASKS[col-1] if col > 0 else 0) | (FILE_MASKS[col+1] if col < 7 else 0) \
+	for col in range(8)]
+
+
+def _ahead_mask(side, sq, rows=8):
+	# Squares on the file of 'sq' and its neighbouring files up to 'rows' rows in front of
+	# it from the point of view of 'side' (white moves towards row 0)
+	row, col = divmod(sq, 8)
+	step = -1 if side == 0 else 1
+	mask = 0
+	for distance in range(1, rows+1):
+		r = row + step*distance
+		if not 0 <= r < 8:
+			break
+		for c in (col-1, col, col+1):
+			if 0 <= c < 8:
+				mask |= BIT[r*8 + c]
+	return mask
+
+
+# Squares that must be free of enemy pawns for a pawn on a square to be passed, by side
+PASSED_MASKS = [[_ahead_mask(side, sq) for sq in range(64)] for side in (0, 1)]
+# Shield squares one and two rows in front of a king on a square, by side
+SHIELD_MASKS = [[(_ahead_mask(side, sq, 1), _ahead_mask(side, sq, 2) & ~_ahead_mask(side, sq, 1)) \
+	for sq in range(64)] for side in (0, 1)]
+
+
+def pawn_structure(pieces):
+	# Scores the doubled, isolated and passed pawns and the pawn shields of both kings in
+	# centipawns for white, given Bitboards.pieces
+	score = 0
+	for side, sign in ((0, 1), (1, -1)):
+		pawns = pieces[side][PAWN]
+		enemy_pawns = pieces[side ^ 1][PAWN]
+		side_score = 0
+		for col in range(8):
+			on_file = popcount(pawns & FILE_MASKS[col])
+			if not on_file:
+				continue
+			side_score += DOUBLED_PAWN * (on_file - 1)
+			if not pawns & NEIGHBOUR_FILES[col]:
+				side_score += ISOLATED_PAWN * on_file
+		bb = pawns
+		while bb:
+			low = bb & -bb
+			sq = low.bit_length() - 1
+			if not enemy_pawns & PASSED_MASKS[side][sq]:
+				side_score += PASSED_PAWN[7 - sq // 8 if side == 0 else sq // 8]
+			bb ^= low
+		king = pieces[side][KING]
+		if king:
+			near, far = SHIELD_MASKS[side][lsb(king)]
+			side_score += SHIELD_PAWN[0] * popcount(pawns & near) + SHIELD_PAWN[1] * popcount(pawns & far)
+		score += sign * side_score
+	return score
+
+
+class PawnTable(HashTable):
+	# A preallocated, always-replace cache of pawn_structure scores. It is keyed by
+	# Chess.pawn_hash combined with the kings' squares, since the shields depend on them.
+	entry_bytes = ENTRY_BYTES
+
+	def __init__(self, size_mb=1):
+		HashTable.__init__(self, size_mb)
+
+	def allocate(self, entries):
+		self.keys = array('Q', [0]) * entries
+		self.scores = array('i', [0]) * entries
+
+	def score(self, key, pieces):
+		# Returns the pawn_structure score of Bitboards.pieces whose pawns and kings hash to 'key'
+		index = key & self.mask
+		if self.keys[index] == key:
+			self.hits += 1
+			return self.scores[index]
+		self.misses += 1
+		score = pawn_structure(pieces)
+		self.keys[index] = key
+		self.scores[index] = score
+		return score
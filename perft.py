@@ -0,0 +1,119 @@
+# Perft benchmark and move generator regression suite for chess.py
+#
+# Usage:
+#	python perft.py                        Run the standard suite up to depth 3
+#	python perft.py --depth 4              Run the suite deeper
+#	python perft.py --fen FEN --depth 3    Count a single position
+#	python perft.py --fen FEN --divide 3   Show the count below each move
+#	python perft.py --legacy               Use Piece.available_moves and is_valid_move
+#
+# Exits with status 1 if any count differs from its known value.
+
+import argparse
+import sys
+import time
+
+from chess import Chess, START_FEN
+
+# (name, FEN, known node counts for depth 1, 2, 3, ...)
+PERFT_SUITE = [
+	('start', START_FEN,
+		(20, 400, 8902, 197281, 4865609)),
+	('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+		(48, 2039, 97862, 4085603)),
+	('endgame', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+		(14, 191, 2812, 43238, 674624)),
+	('promotions', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+		(6, 264, 9467, 422333)),
+	('mirrored promotions', 'r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1',
+		(6, 264, 9467, 422333)),
+	('discovered checks', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+		(44, 1486, 62379, 2103487)),
+	('middlegame', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+		(46, 2079, 89890, 3894594)),
+	('illegal en passant 1', '3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1',
+		(18, 92, 1670, 10138, 185429, 1134888)),
+	('illegal en passant 2', '8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1',
+		(13, 102, 1266, 10276, 135655, 1015133)),
+	('en passant gives check', '8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1',
+		(15, 126, 1928, 13931, 206379, 1440467)),
+	('short castle gives check', '5k2/8/8/8/8/8/8/4K2R w K - 0 1',
+		(15, 66, 1198, 6399, 120330, 661072)),
+	('long castle gives check', '3k4/8/8/8/8/8/8/R3K3 w Q - 0 1',
+		(16, 71, 1286, 7418, 141077, 803711)),
+	('castling rights', 'r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1',
+		(26, 1141, 27826, 1274206)),
+	('castling prevented', 'r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1',
+		(44, 1494, 50509, 1720476)),
+	('promote out of check', '2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1',
+		(11, 133, 1442, 19174, 266199, 3821001)),
+	('discovered check', '8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1',
+		(29, 165, 5160, 31961, 1004658)),
+	('promote to give check', '4k3/1P6/8/8/8/8/K7/8 w - - 0 1',
+		(9, 40, 472, 2661, 38983, 217342)),
+	('underpromote to check', '8/P1k5/K7/8/8/8/8/8 w - - 0 1',
+		(6, 27, 273, 1329, 18135, 92683)),
+	('self stalemate', 'K1k5/8/P7/8/8/8/8/8 w - - 0 1',
+		(2, 6, 13, 63, 382, 2217)),
+	('stalemate and checkmate 1', '8/k1P5/8/1K6/8/8/8/8 w - - 0 1',
+		(10, 25, 268, 926, 10857, 43261, 567584)),
+	('stalemate and checkmate 2', '8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1',
+		(37, 183, 6559, 23527)),
+]
+
+
+def run_perft(fen, depth, legacy=False):
+	# Returns (nodes, seconds) for one position
+	game = Chess.from_fen(fen)
+	start = time.perf_counter()
+	nodes = game.perft(depth, legacy)
+	return nodes, time.perf_counter() - start
+
+
+def run_suite(max_depth=3, legacy=False, out=sys.stdout):
+	# Runs every suite position to max_depth, printing counts and speed
+	# Returns the number of counts that did not match
+	failures = 0
+	total_nodes, total_time = 0, 0.0
+	for name, fen, counts in PERFT_SUITE:
+		for depth in range(1, min(max_depth, len(counts)) + 1):
+			nodes, seconds = run_perft(fen, depth, legacy)
+			total_nodes += nodes
+			total_time += seconds
+			status = 'ok' if nodes == counts[depth-1] else 'FAIL (expected %d)' % counts[depth-1]
+			if nodes != counts[depth-1]:
+				failures += 1
+			out.write('%-24s depth %d %10d nodes %8.2fs %8.0f nps  %s\n' % \
+				(name, depth, nodes, seconds, nodes / max(seconds, 1e-9), status))
+	out.write('\nTotal: %d nodes in %.2fs (%.0f nps), %d failures\n' % \
+		(total_nodes, total_time, total_nodes / max(total_time, 1e-9), failures))
+	return failures
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Perft move generator benchmark')
+	parser.add_argument('--fen', help='position to count instead of running the suite')
+	parser.add_argument('--depth', type=int, default=3, help='search depth (default 3)')
+	parser.add_argument('--divide', type=int, metavar='DEPTH', help='show counts below each move')
+	parser.add_argument('--legacy', action='store_true', \
+		help='generate moves with Piece.available_moves and is_valid_move')
+	args = parser.parse_args(argv)
+
+	if args.divide:
+		game = Chess.from_fen(args.fen or START_FEN)
+		counts = game.divide(args.divide, args.legacy)
+		for move in sorted(counts):
+			print('%s: %d' % (move, counts[move]))
+		print('\nMoves: %d\nNodes: %d' % (len(counts), sum(counts.values())))
+		return 0
+
+	if args.fen:
+		nodes, seconds = run_perft(args.fen, args.depth, args.legacy)
+		print('Nodes: %d\nTime: %.2fs\nNPS: %.0f' % (nodes, seconds, nodes / max(seconds, 1e-9)))
+		return 0
+
+	return 1 if run_suite(args.depth, args.legacy) else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,309 @@
+# Portable Game Notation reader and writer for chess.py
+#
+# read_games streams games one at a time from a file of any size, and each game
+# resolves its Standard Algebraic Notation moves against the legal move generator
+# only when they are asked for:
+#
+#	with open('games.pgn') as f:
+#		for game in read_games(f):
+#			for position in game.positions():
+#				...
+#
+# write_game writes the moves played in a Chess object, e.g. with play_turn.
+
+import re
+
+from chess import Chess, START_FEN, WHITE, BLACK
+from bitboard import PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING
+
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+
+# Tags every game has, in the order they are written
+SEVEN_TAG_ROSTER = (('Event', '?'), ('Site', '?'), ('Date', '????.??.??'), ('Round', '?'), \
+	('White', '?'), ('Black', '?'), ('Result', '*'))
+
+PIECE_LETTERS = {KNIGHT:'N', BISHOP:'B', ROOK:'R', QUEEN:'Q', KING:'K'}
+LETTER_PIECES = {'N':KNIGHT, 'B':BISHOP, 'R':ROOK, 'Q':QUEEN, 'K':KING}
+PROMOTION_LETTERS = {'queen':'Q', 'rook':'R', 'bishop':'B', 'knight':'N'}
+LETTER_PROMOTIONS = {'Q':'queen', 'R':'rook', 'B':'bishop', 'N':'knight'}
+
+TAG_RE = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+TOKEN_RE = re.compile(r'[{}();]|\$\d+|[^\s{}();]+')
+MOVE_NUMBER_RE = re.compile(r'^\d+\.+')
+SAN_RE = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQnbrq]))?$')
+
+
+def square_name(pos):
+	return chr(pos[1]+97) + str(8-pos[0])
+
+
+def move_to_san(game, move, moves=None):
+	# Returns the legal move 'move' (in the form taken by Chess.push) written in
+	# Standard Algebraic Notation for the current position of 'game'.
+	# 'moves' can be passed to reuse an already generated list of legal moves.
+	start, (destination, special) = move[0], move[1]
+	piece = game.board[start]
+
+	if piece.kind == KING and special:
+		san = 'O-O' if destination[1] == 6 else 'O-O-O'
+	elif piece.kind == PAWN:
+		san = square_name(destination)
+		if destination in game.board or special:
+			san = square_name(start)[0] + 'x' + san
+		if len(move) > 2:
+			san += '=' + PROMOTION_LETTERS[move[2]]
+	else:
+		if moves is None:
+			moves = game.legal_moves(game.turn)
+		# Name the starting file, rank or both if another piece of the same kind can also move there
+		rivals = [m[0] for m in moves if m[1][0] == destination and m[0] != start \
+			and game.board[m[0]].kind == piece.kind]
+		prefix = ''
+		if rivals:
+			if all(pos[1] != start[1] for pos in rivals):
+				prefix = square_name(start)[0]
+			elif all(pos[0] != start[0] for pos in rivals):
+				prefix = square_name(start)[1]
+			else:
+				prefix = square_name(start)
+		san = PIECE_LETTERS[piece.kind] + prefix
+		if destination in game.board:
+			san += 'x'
+		san += square_name(destination)
+
+	game.push(move)
+	if game.is_in_check(game.turn):
+		san += '+' if game.has_move(game.turn) else '#'
+	game.pop()
+	return san
+
+
+def san_to_move(game, san):
+	# Returns the legal move written as 'san' in the current position of 'game' in the
+	# form taken by Chess.push. Raises ValueError if it is illegal or ambiguous.
+	text = san.rstrip('+#!?')
+	moves = game.legal_moves(game.turn)
+
+	if text in ('O-O', 'O-O-O', '0-0', '0-0-0'):
+		col = 6 if len(text) == 3 else 2
+		for move in moves:
+			if move[1][1] and game.board[move[0]].kind == KING and move[1][0][1] == col:
+				return move
+		raise ValueError('Illegal move: ' + san)
+
+	match = SAN_RE.match(text)
+	if not match:
+		raise ValueError('Invalid move: ' + san)
+	letter, from_file, from_rank, destination, promotion = match.groups()
+	kind = LETTER_PIECES[letter] if letter else PAWN
+	destination = (8-int(destination[1]), ord(destination[0])-97)
+	promotion = LETTER_PROMOTIONS[promotion.upper()] if promotion else None
+
+	found = None
+	for move in moves:
+		start = move[0]
+		if move[1][0] != destination or game.board[start].kind != kind:
+			continue
+		if from_file and start[1] != ord(from_file)-97:
+			continue
+		if from_rank and start[0] != 8-int(from_rank):
+			continue
+		if (move[2] if len(move) > 2 else None) != promotion:
+			continue
+		if found is not None:
+			raise ValueError('Ambiguous move: ' + san)
+		found = move
+	if found is None:
+		raise ValueError('Illegal move: ' + san)
+	return found
+
+
+class PGNGame:
+	# One game read from a PGN file: its tag pairs, its moves in SAN and its result
+
+	def __init__(self, headers=None, moves=None, result='*'):
+		self.headers = headers if headers is not None else {}
+		self.moves = moves if moves is not None else []
+		self.result = result
+
+	def start(self):
+		# Returns a Chess object at the starting position of the game
+		if 'FEN' in self.headers:
+			return Chess.from_fen(self.headers['FEN'])
+		return Chess()
+
+	def resolve(self, game, ply):
+		# Returns the move at index 'ply' in the form taken by Chess.push, with 'game' at
+		# the position before it. Raises ValueError if it cannot be played there.
+		try:
+			return san_to_move(game, self.moves[ply])
+		except ValueError as error:
+			raise ValueError('%s at ply %d of %s' % (error, ply+1, self.describe()))
+
+	def legal_moves(self):
+		# Yields each move of the game in the form taken by Chess.push
+		game = self.start()
+		for ply in range(len(self.moves)):
+			move = self.resolve(game, ply)
+			yield move
+			game.push(move)
+
+	def positions(self):
+		# Yields the game at its starting position and after every move. The same
+		# Chess object is yielded each time, so use its copy method to keep a position.
+		game = self.start()
+		yield game
+		for ply in range(len(self.moves)):
+			game.push(self.resolve(game, ply))
+			yield game
+
+	def end(self):
+		# Returns a Chess object at the final position of the game
+		game = self.start()
+		for ply in range(len(self.moves)):
+			game.push(self.resolve(game, ply))
+		return game
+
+	def describe(self):
+		return '%s vs %s (%s)' % (self.headers.get('White', '?'), self.headers.get('Black', '?'), \
+			self.headers.get('Event', '?'))
+
+
+def read_games(stream):
+	# Yields a PGNGame for each game in a text stream, reading one line at a time.
+	# Comments, variations, numeric annotation glyphs and move numbers are skipped.
+	headers, moves = {}, []
+	in_comment = False
+	variation_depth = 0
+	movetext = False  # Whether moves or other tokens of the current game have been read
+
+	for line in stream:
+		if in_comment:
+			end = line.find('}')
+			if end < 0:
+				continue
+			line = line[end+1:]
+			in_comment = False
+		elif line.startswith('%'):
+			continue  # Escaped line
+		elif line.lstrip().startswith('['):
+			if movetext:
+				# A new game started before the last one gave its result
+				yield PGNGame(headers, moves, headers.get('Result', '*'))
+				headers, moves, movetext, variation_depth = {}, [], False, 0
+			end = 0
+			for match in TAG_RE.finditer(line):
+				name, value = match.groups()
+				headers[name] = value.replace('\\"', '"').replace('\\\\', '\\')
+				end = match.end()
+			if not end:
+				continue
+			line = line[end:]  # Movetext can follow the tags on the same line
+
+		for token in TOKEN_RE.findall(line):
+			if in_comment:
+				if token == '}':
+					in_comment = False
+				continue
+			if token == '{':
+				in_comment = True
+			elif token == ';':
+				break  # Comment to the end of the line
+			elif token == '(':
+				variation_depth += 1
+			elif token == ')':
+				variation_depth = max(0, variation_depth - 1)
+			elif variation_depth or token[0] == '$':
+				continue
+			elif token in RESULTS:
+				yield PGNGame(headers, moves, token)
+				headers, moves, movetext = {}, [], False
+			else:
+				token = MOVE_NUMBER_RE.sub('', token)
+				if token:
+					moves.append(token)
+				movetext = True
+
+	if movetext or headers:
+		yield PGNGame(headers, moves, headers.get('Result', '*'))
+
+
+def read_file(path):
+	# Yields a PGNGame for each game in the PGN file at 'path'
+	with open(path, encoding='utf-8', errors='replace') as stream:
+		for game in read_games(stream):
+			yield game
+
+
+def game_result(game):
+	# Returns '1-0', '0-1' or '1/2-1/2' if the game is over at its current position, otherwise '*'
+	if game.has_move(game.turn):
+		return '*'
+	if game.is_in_check(game.turn):
+		return '1-0' if game.turn == BLACK else '0-1'
+	return '1/2-1/2'
+
+
+def game_to_pgn(game, headers=None, result=None):
+	# Returns the moves played on a Chess object as PGN text. The game is taken back
+	# to its first recorded position and replayed, so it ends where it started.
+	# 'headers' adds or replaces tags and the result is worked out if it is not given.
+	moves = [record[0] for record in game.history]
+	if game.promotion_required:
+		moves.pop()  # The last move is waiting for its promotion piece
+	if result is None:
+		result = game_result(game) if not game.promotion_required else '*'
+
+	pending = None
+	if game.promotion_required:
+		pending = game.pop()
+		game.promotion_required = False
+	for _ in moves:
+		game.pop()
+	start_fen = game.to_fen()
+	sans = []
+	try:
+		for move in moves:
+			sans.append((game.turn, game.fullmove_number, move_to_san(game, move)))
+			game.push(move)
+	finally:
+		if pending is not None:
+			game.push(pending)
+			game.promotion_required = True
+
+	tags = dict(SEVEN_TAG_ROSTER)
+	if start_fen != START_FEN:
+		tags['SetUp'] = '1'
+		tags['FEN'] = start_fen
+	tags.update(headers or {})
+	tags['Result'] = result
+
+	lines = []
+	for name, value in tags.items():
+		lines.append('[%s "%s"]' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"')))
+	lines.append('')
+
+	tokens = []
+	for i, (turn, number, san) in enumerate(sans):
+		if turn == WHITE:
+			tokens.append('%d.' % number)
+		elif i == 0:
+			tokens.append('%d...' % number)
+		tokens.append(san)
+	tokens.append(result)
+
+	# Wrap the movetext at 80 characters
+	line = ''
+	for token in tokens:
+		if line and len(line) + 1 + len(token) > 80:
+			lines.append(line)
+			line = token
+		else:
+			line = line + ' ' + token if line else token
+	lines.append(line)
+	return '\n'.join(lines) + '\n'
+
+
+def write_game(stream, game, headers=None, result=None):
+	# Writes the moves played on a Chess object to a text stream as a PGN game
+	stream.write(game_to_pgn(game, headers, result) + '\n')
@@ -0,0 +1,331 @@
+# Alpha-beta search engine for chess.py
+
+import time
+
+from bitboard import PAWN, KING, BIT, TACTICAL, encode_move
+from evaluation import evaluate
+from ordering import MoveOrdering
+from pawns import PawnTable
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+
+MATE_SCORE = 100000
+INFINITY = 1000000
+MAX_PLY = 128
+
+# Centipawn values for exchanges, where a king can only capture last
+SEE_VALUES = (100, 320, 330, 500, 900, 20000)
+
+# Selective search settings, each of which can be switched off through Search.settings
+NULL_MOVE_MIN_DEPTH = 3
+LMR_MIN_DEPTH = 3
+LMR_MIN_MOVES = 3  # Moves searched at full depth before later quiet moves are reduced
+FUTILITY_MARGINS = (0, 200, 500)  # Indexed by remaining depth
+DEFAULT_SETTINGS = {'null_move':True, 'lmr':True, 'futility':True}
+
+
+def see(bitboards, from_sq, to_sq):
+	# Static exchange evaluation: the material won by the piece on from_sq capturing on
+	# to_sq if both sides then keep recapturing there with their least valuable piece
+	# for as long as it pays. Sliders uncovered by earlier captures join in.
+	side, kind = bitboards.piece_at(from_sq)
+	target = bitboards.piece_at(to_sq)
+	gains = [SEE_VALUES[target[1]] if target else 0]
+	attacker_value = SEE_VALUES[kind]
+	occupied = bitboards.all ^ BIT[from_sq]
+	side ^= 1
+	while True:
+		attackers = bitboards.attackers_to(to_sq, side, occupied)
+		if not attackers:
+			break
+		for kind, bb in enumerate(bitboards.pieces[side]):
+			if attackers & bb:
+				break
+		gains.append(attacker_value - gains[-1])  # Gain for 'side' if it takes the last capturing piece
+		attacker_value = SEE_VALUES[kind]
+		bb = attackers & bb
+		occupied ^= bb & -bb
+		side ^= 1
+	# Each side may stop capturing when continuing would lose material
+	while len(gains) > 1:
+		gain = gains.pop()
+		gains[-1] = -max(-gains[-1], gain)
+	return gains[0]
+
+
+def move_see(game, move):
+	# Exchange value of a capture in the Chess move form. En passant is scored as even.
+	start, (destination, special) = move[0], move[1]
+	if destination not in game.board:
+		return 0
+	return see(game.bitboards, start[0]*8 + start[1], destination[0]*8 + destination[1])
+
+
+def score_to_tt(score, ply):
+	# Mate scores are stored as distance from the current node rather than the root
+	if score >= MATE_SCORE - MAX_PLY:
+		return score + ply
+	if score <= -MATE_SCORE + MAX_PLY:
+		return score - ply
+	return score
+
+
+def score_from_tt(score, ply):
+	if score >= MATE_SCORE - MAX_PLY:
+		return score - ply
+	if score <= -MATE_SCORE + MAX_PLY:
+		return score + ply
+	return score
+
+
+def public_move(move):
+	# Converts a legal move to the (start_pos, end_pos) form returned by Chess.get_smart_move,
+	# with the promotion piece name appended for promotions
+	return (move[0], move[1][0]) + move[2:]
+
+
+class Search:
+	# Negamax alpha-beta search with iterative deepening and time and node budgets.
+	# Null move pruning, late move reductions and futility pruning make it selective;
+	# 'settings' can switch each of them off by name (see DEFAULT_SETTINGS).
+
+	def __init__(self, game, tt=None, settings=None, pawn_table=None):
+		self.game = game
+		self.settings = dict(DEFAULT_SETTINGS)
+		self.settings.update(settings or {})
+		self.tt = tt if tt is not None else TranspositionTable()
+		self.pawn_table = pawn_table if pawn_table is not None else PawnTable()
+		self.nodes = 0
+		self.stopped = False
+		self.deadline = None
+		self.node_limit = None
+		self.pv_table = [[] for _ in range(MAX_PLY+1)]
+		self.root_score = 0  # Score of pv_table[0] in the iteration being searched
+		self.ordering = MoveOrdering(MAX_PLY, see)
+
+	def stop(self):
+		# Ask a running search to return as soon as possible
+		self.stopped = True
+
+	def search(self, depth=None, time_ms=None, nodes=None, on_iteration=None):
+		# Searches the current position, deepening one ply at a time until the depth,
+		# time (milliseconds) or node budget runs out. Returns (move, score, pv) for the
+		# deepest completed iteration, or (None, score, []) if there are no legal moves.
+		# on_iteration(depth, score, nodes, seconds, pv) is called after each completed
+		# iteration.
+		game = self.game
+		start = time.perf_counter()
+		self.nodes = 0
+		self.reset_stats()
+		self.stopped = False
+		self.deadline = start + time_ms / 1000 if time_ms else None
+		self.node_limit = nodes
+		self.tt.new_search()
+		self.pawn_table.reset_stats()
+		self.ordering.new_search()
+		max_depth = min(depth or MAX_PLY, MAX_PLY)
+
+		moves = game.legal_moves(game.turn)
+		if not moves:
+			return (None, -MATE_SCORE if game.is_in_check(game.turn) else 0, [])
+
+		best_move, best_score, best_pv = moves[0], 0, [moves[0]]
+		for iteration in range(1, max_depth+1):
+			score = self.negamax(iteration, -INFINITY, INFINITY, 0, best_pv)
+			if self.stopped:
+				# Keep the result of the last completed iteration, or the best root move
+				# found so far if the first one was cut short
+				if iteration == 1 and self.pv_table[0]:
+					best_pv = self.pv_table[0][:]
+					best_move, best_score = best_pv[0], self.root_score
+				break
+			best_pv = self.pv_table[0][:]
+			best_move, best_score = best_pv[0], score
+			if on_iteration:
+				on_iteration(iteration, best_score, self.nodes, time.perf_counter() - start, \
+					[public_move(move) for move in best_pv])
+			if abs(best_score) >= MATE_SCORE - MAX_PLY:
+				break
+
+		return (public_move(best_move), best_score, [public_move(move) for move in best_pv])
+
+	def check_limits(self):
+		if self.deadline is not None and time.perf_counter() >= self.deadline:
+			self.stopped = True
+		if self.node_limit is not None and self.nodes >= self.node_limit:
+			self.stopped = True
+
+	def reset_stats(self):
+		self.null_move_tries = 0
+		self.null_move_cutoffs = 0
+		self.reductions = 0  # Moves searched to a reduced depth
+		self.re_searches = 0  # Reduced moves that beat alpha and were searched again
+		self.futility_prunes = 0  # Quiet moves skipped as unable to raise alpha
+
+	def stats(self):
+		# Counters for the last search, including how well its moves were ordered
+		# and how often each selective technique was applied
+		stats = {'nodes':self.nodes, 'null_move_tries':self.null_move_tries, \
+			'null_move_cutoffs':self.null_move_cutoffs, 'reductions':self.reductions, \
+			're_searches':self.re_searches, 'futility_prunes':self.futility_prunes}
+		stats.update(self.ordering.stats())
+		stats.update({'pawn_hits':self.pawn_table.hits, 'pawn_misses':self.pawn_table.misses, \
+			'pawn_hit_rate':self.pawn_table.hit_rate()})
+		return stats
+
+	def negamax(self, depth, alpha, beta, ply, pv=None, null_allowed=True):
+		# Returns the score of the position for the side to move
+		game = self.game
+		self.nodes += 1
+		if self.nodes & 1023 == 0:
+			self.check_limits()
+		self.pv_table[ply] = []
+
+		if depth <= 0 or ply >= MAX_PLY:
+			return self.quiesce(alpha, beta, ply)
+
+		# Transposition table cutoff, only in null window nodes so that the principal
+		# variation is always searched and pv_table filled along it
+		key = game.hash
+		entry = self.tt.probe(key)
+		tt_move = 0
+		if entry is not None:
+			tt_move, tt_score, tt_depth, bound = entry
+			if beta - alpha == 1 and tt_depth >= depth:
+				tt_score = score_from_tt(tt_score, ply)
+				if bound == EXACT or (bound == LOWER and tt_score >= beta) or \
+					(bound == UPPER and tt_score <= alpha):
+					return tt_score
+
+		settings = self.settings
+		in_check = game.is_in_check(game.turn)
+		static_eval = evaluate(game, self.pawn_table) if not in_check else -INFINITY
+
+		# Null move pruning: if passing still fails high after a reduced search the
+		# position is good enough to cut off. Not tried in check, straight after another
+		# null move or with only pawns left, where passing could be better than any move.
+		if settings['null_move'] and ply and null_allowed and not in_check and \
+			depth >= NULL_MOVE_MIN_DEPTH and static_eval >= beta and beta < MATE_SCORE - MAX_PLY and \
+			self.has_pieces(game):
+			self.null_move_tries += 1
+			reduction = 3 if depth > 6 else 2
+			game.push_null()
+			score = -self.negamax(depth-1-reduction, -beta, -beta+1, ply+1, None, False)
+			game.pop_null()
+			if self.stopped:
+				return 0
+			if score >= beta:
+				self.null_move_cutoffs += 1
+				return beta
+
+		# Futility pruning: near the leaves, quiet moves cannot bring a position far
+		# below alpha back up to it
+		futile = settings['futility'] and ply and not in_check and depth < len(FUTILITY_MARGINS) and \
+			abs(alpha) < MATE_SCORE - MAX_PLY and static_eval + FUTILITY_MARGINS[depth] <= alpha
+
+		alpha_start = alpha
+		best_move = None
+		searched = 0
+		pv_move = pv[ply] if pv and len(pv) > ply else None
+		first = (encode_move(pv_move) if pv_move else 0, tt_move)
+		for move in self.ordering.moves(game, ply, first):
+			quiet = self.ordering.is_quiet(game, move)
+			game.push(move)
+			gives_check = quiet and (futile or searched >= LMR_MIN_MOVES) and game.is_in_check(game.turn)
+			if futile and quiet and searched and not gives_check:
+				game.pop()
+				self.futility_prunes += 1
+				continue
+			searched += 1
+
+			# Late move reductions: quiet moves ordered late are searched less deeply
+			# with a null window, and again at full depth only if they beat alpha
+			score = None
+			if settings['lmr'] and quiet and not in_check and not gives_check and \
+				depth >= LMR_MIN_DEPTH and searched > LMR_MIN_MOVES:
+				self.reductions += 1
+				reduction = 1 if searched <= 10 or depth < 6 else 2
+				score = -self.negamax(depth-1-reduction, -alpha-1, -alpha, ply+1)
+				if score > alpha:
+					self.re_searches += 1
+					score = None
+			if score is None:
+				score = -self.negamax(depth-1, -beta, -alpha, ply+1, pv if move == pv_move else None)
+			game.pop()
+			if self.stopped:
+				return 0
+			if score > alpha:
+				alpha = score
+				best_move = move
+				self.pv_table[ply] = [move] + self.pv_table[ply+1]
+				if not ply:
+					self.root_score = score
+				if score >= beta:
+					self.ordering.record_cutoff(game, move, ply, depth, searched-1)
+					break
+
+		if not searched:
+			return -MATE_SCORE + ply if in_check else 0
+
+		if alpha >= beta:
+			bound = LOWER
+		elif alpha > alpha_start:
+			bound = EXACT
+		else:
+			bound = UPPER
+		self.tt.store(key, encode_move(best_move) if best_move else 0, score_to_tt(alpha, ply), \
+			depth, bound)
+		return alpha
+
+	def has_pieces(self, game):
+		# Whether the side to move has anything besides pawns and its king
+		pieces = game.bitboards.pieces[0 if game.turn == 'white' else 1]
+		return game.bitboards.occupied[0 if game.turn == 'white' else 1] != pieces[PAWN] | pieces[KING]
+
+	def quiesce(self, alpha, beta, ply):
+		# Searches captures and queen promotions until the position is quiet, so that
+		# leaf scores are not taken in the middle of an exchange. The side to move may
+		# stand pat on the static evaluation unless it is in check, when every move is tried.
+		# Captures that lose material by static exchange evaluation are skipped and the
+		# rest are tried by most valuable victim and least valuable attacker.
+		game = self.game
+		self.nodes += 1
+		if self.nodes & 1023 == 0:
+			self.check_limits()
+		self.pv_table[ply] = []
+		if ply >= MAX_PLY:
+			return evaluate(game, self.pawn_table)
+
+		in_check = game.is_in_check(game.turn)
+		if not in_check:
+			stand_pat = evaluate(game, self.pawn_table)
+			if stand_pat >= beta:
+				return stand_pat
+			alpha = max(alpha, stand_pat)
+
+		if in_check:
+			moves = game.legal_moves(game.turn)
+			if not moves:
+				return -MATE_SCORE + ply
+		else:
+			# Only captures and promotions are generated, so stalemates are not seen here
+			tactical = []
+			for move in game.legal_moves(game.turn, TACTICAL):
+				if len(move) > 2 and move[2] != 'queen':
+					continue  # Underpromotions are left to the main search
+				if move_see(game, move) >= 0:
+					tactical.append((self.ordering.capture_score(game, move), move))
+			tactical.sort(key=lambda capture: -capture[0])
+			moves = [move for _, move in tactical]
+
+		for move in moves:
+			game.push(move)
+			score = -self.quiesce(-beta, -alpha, ply+1)
+			game.pop()
+			if self.stopped:
+				return 0
+			if score > alpha:
+				alpha = score
+				self.pv_table[ply] = [move] + self.pv_table[ply+1]
+				if score >= beta:
+					break
+		return alpha
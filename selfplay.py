@@ -0,0 +1,248 @@
+# Self-play game generator for chess.py
+#
+# Usage:
+#	python selfplay.py --games 1000 --out games.bin                  Random games on every core
+#	python selfplay.py --games 1000 --policy search --nodes 5000 --out games.bin
+#	python selfplay.py --replay 17 --out games.bin                   Replay one game and check it
+#	python selfplay.py --dump games.bin                              Print a summary of each game
+#
+# Every game is played from its own seed (the base seed plus its index), so a game
+# is the same whichever worker plays it and can be replayed from its seed alone.
+# Games are written as soon as they finish, to a file holding a one line text
+# header followed by one binary record per game.
+
+import argparse
+import functools
+import multiprocessing
+import random
+import struct
+import sys
+import time
+from array import array
+
+from chess import Chess, START_FEN, WHITE, decode_legal
+from bitboard import PAWN, KNIGHT, BISHOP, ROOK, QUEEN, encode_move, popcount
+
+POLICIES = ('random', 'smart', 'search')
+
+# Results and the reasons games end, as stored in records
+RESULTS = ('1/2-1/2', '1-0', '0-1', '*')
+DRAW, WHITE_WINS, BLACK_WINS, UNFINISHED = range(4)
+TERMINATIONS = ('checkmate', 'stalemate', 'fifty moves', 'repetition', 'insufficient material', \
+	'move limit')
+CHECKMATE, STALEMATE, FIFTY_MOVES, REPETITION, INSUFFICIENT_MATERIAL, MOVE_LIMIT = range(6)
+
+MAGIC = 'chess-selfplay'
+# Record: seed, result, termination, number of plies, followed by one
+# bitboard.encode_move code per ply
+record_struct = struct.Struct('<IBBH')
+
+
+def find_public_move(game, start, destination, promotion=None):
+	# Returns the legal move from 'start' to 'destination' in the form taken by Chess.push,
+	# promoting to 'promotion' or a queen if it is a promotion
+	for move in game.legal_moves(game.turn):
+		if move[0] == start and move[1][0] == destination:
+			if len(move) == 2 or move[2] == (promotion or 'queen'):
+				return move
+	return None
+
+
+def insufficient_material(game):
+	# Only kings, or kings and a single knight or bishop, are left
+	pieces = game.bitboards.pieces
+	for side in (0, 1):
+		if pieces[side][PAWN] or pieces[side][ROOK] or pieces[side][QUEEN]:
+			return False
+	minors = sum(popcount(pieces[side][KNIGHT] | pieces[side][BISHOP]) for side in (0, 1))
+	return minors <= 1
+
+
+def termination(game, seen, plies, max_plies):
+	# Returns why the game is over (CHECKMATE, STALEMATE and so on), or None if it is not.
+	# 'seen' counts the occurrences of each position hash and 'plies' the moves played.
+	if not game.has_move(game.turn):
+		return CHECKMATE if game.is_in_check(game.turn) else STALEMATE
+	if game.halfmove_clock >= 100:
+		return FIFTY_MOVES
+	if seen[game.hash] >= 3:
+		return REPETITION
+	if insufficient_material(game):
+		return INSUFFICIENT_MATERIAL
+	if plies >= max_plies:
+		return MOVE_LIMIT
+	return None
+
+
+def choose_move(game, policy, rng, depth, nodes):
+	# Returns the move to play for the side to move in the form taken by Chess.push
+	if policy == 'random':
+		return rng.choice(game.legal_moves(game.turn))
+	if policy == 'smart':
+		move = game.get_smart_move(game.turn)  # Draws from the random module seeded by play_game
+	else:
+		move = game.get_best_move(game.turn, depth=depth, nodes=nodes)[0]
+	return find_public_move(game, *move)
+
+
+def play_game(seed, policy='random', depth=None, nodes=2000, max_plies=400, random_plies=4, \
+	fen=START_FEN, table_mb=1):
+	# Plays one game and returns (seed, result, termination, encoded moves).
+	# The first random_plies moves are random so searched games differ from each other.
+	# Searches are limited by depth and nodes, never by time, so games can be replayed.
+	rng = random.Random(seed)
+	random.seed(seed)
+	game = Chess.from_fen(fen)
+	if policy == 'search':
+		game.set_table_size(table_mb)  # A fresh table per game keeps searches reproducible
+	seen = {game.hash: 1}
+	moves = array('H')
+
+	while True:
+		end = termination(game, seen, len(moves), max_plies)
+		if end == CHECKMATE:
+			return (seed, WHITE_WINS if game.turn != WHITE else BLACK_WINS, end, moves)
+		if end is not None:
+			return (seed, UNFINISHED if end == MOVE_LIMIT else DRAW, end, moves)
+
+		move = choose_move(game, 'random' if len(moves) < random_plies else policy, rng, depth, nodes)
+		game.push(move)
+		moves.append(encode_move(move))
+		seen[game.hash] = seen.get(game.hash, 0) + 1
+
+
+def write_header(stream, options):
+	line = MAGIC + ''.join(' %s=%s' % (name, options[name]) for name in sorted(options) \
+		if name != 'fen') + ' fen=' + options['fen'] + '\n'
+	stream.write(line.encode())
+
+
+def read_header(stream):
+	# Returns the options a file was generated with
+	fields = stream.readline().decode().split(' fen=')
+	words = fields[0].split()
+	if not words or words[0] != MAGIC or len(fields) != 2:
+		raise ValueError('Not a self-play file')
+	options = {'fen': fields[1].strip()}
+	for word in words[1:]:
+		name, value = word.split('=', 1)
+		options[name] = value if name == 'policy' else (None if value == 'None' else int(value))
+	return options
+
+
+def write_record(stream, record):
+	seed, result, termination, moves = record
+	if sys.byteorder == 'big':
+		moves = array('H', moves)
+		moves.byteswap()
+	stream.write(record_struct.pack(seed, result, termination, len(moves)) + moves.tobytes())
+
+
+def read_records(stream):
+	# Yields (seed, result, termination, encoded moves) for each record after the header
+	while True:
+		data = stream.read(record_struct.size)
+		if len(data) < record_struct.size:
+			return
+		seed, result, termination, plies = record_struct.unpack(data)
+		moves = array('H')
+		moves.frombytes(stream.read(2*plies))
+		if sys.byteorder == 'big':
+			moves.byteswap()
+		yield (seed, result, termination, moves)
+
+
+def record_positions(record, fen=START_FEN):
+	# Yields the game at its starting position and after each recorded move.
+	# The same Chess object is yielded each time, so use its copy method to keep a position.
+	game = Chess.from_fen(fen)
+	yield game
+	for code in record[3]:
+		move = decode_legal(game, code)
+		if move is None:
+			raise ValueError('Recorded move %d is not legal' % code)
+		game.push(move)
+		yield game
+
+
+def generate(games, path, seed=0, processes=None, out=sys.stdout, **options):
+	# Plays 'games' games on a process pool and appends each to 'path' as it finishes.
+	# Returns the number of games with each result, indexed by DRAW, WHITE_WINS, BLACK_WINS and UNFINISHED.
+	options.setdefault('fen', START_FEN)
+	task = functools.partial(play_game, **options)
+	header = dict(options, seed=seed)
+	counts = [0, 0, 0, 0]
+	start = time.perf_counter()
+	plies = 0
+	with open(path, 'wb') as stream, multiprocessing.Pool(processes) as pool:
+		write_header(stream, header)
+		chunksize = max(1, min(64, games // (4 * (processes or multiprocessing.cpu_count()))))
+		for i, record in enumerate(pool.imap_unordered(task, range(seed, seed+games), chunksize)):
+			write_record(stream, record)
+			counts[record[1]] += 1
+			plies += len(record[3])
+			if (i + 1) % 100 == 0 or i + 1 == games:
+				stream.flush()
+				seconds = time.perf_counter() - start
+				out.write('%d games, %d plies, %.1f games/s\r' % (i+1, plies, (i+1) / max(seconds, 1e-9)))
+				out.flush()
+	out.write('\n')
+	return counts
+
+
+def replay(path, seed):
+	# Plays the game with 'seed' again with the options stored in the file and returns
+	# (stored record, replayed record). They are equal if the game is reproducible.
+	with open(path, 'rb') as stream:
+		options = read_header(stream)
+		for record in read_records(stream):
+			if record[0] == seed:
+				break
+		else:
+			raise ValueError('No game with seed %d in %s' % (seed, path))
+	options.pop('seed', None)
+	return record, play_game(seed, **options)
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Generate self-play games on every core')
+	parser.add_argument('--games', type=int, default=100, help='number of games (default 100)')
+	parser.add_argument('--out', default='selfplay.bin', help='output file (default selfplay.bin)')
+	parser.add_argument('--policy', choices=POLICIES, default='random', help='how moves are chosen')
+	parser.add_argument('--depth', type=int, help='search depth limit for the search policy')
+	parser.add_argument('--nodes', type=int, default=2000, help='search node limit (default 2000)')
+	parser.add_argument('--max-plies', type=int, default=400, help='adjudicate longer games as unfinished')
+	parser.add_argument('--random-plies', type=int, default=4, help='random moves at the start of each game')
+	parser.add_argument('--fen', default=START_FEN, help='starting position')
+	parser.add_argument('--seed', type=int, default=0, help='seed of the first game')
+	parser.add_argument('--processes', type=int, help='worker processes (default one per core)')
+	parser.add_argument('--replay', type=int, metavar='SEED', help='replay a game from --out and check it')
+	parser.add_argument('--dump', metavar='FILE', help='print one line per game in a file')
+	args = parser.parse_args(argv)
+
+	if args.dump:
+		with open(args.dump, 'rb') as stream:
+			print(read_header(stream))
+			for seed, result, termination, moves in read_records(stream):
+				print('%d %s %s %d plies' % (seed, RESULTS[result], TERMINATIONS[termination], len(moves)))
+		return 0
+
+	if args.replay is not None:
+		stored, replayed = replay(args.out, args.replay)
+		print('%s %s, %d plies' % (RESULTS[replayed[1]], TERMINATIONS[replayed[2]], len(replayed[3])))
+		if stored != replayed:
+			print('Replay differs from the stored game')
+			return 1
+		print('Replay matches the stored game')
+		return 0
+
+	counts = generate(args.games, args.out, args.seed, args.processes, policy=args.policy, \
+		depth=args.depth, nodes=args.nodes, max_plies=args.max_plies, random_plies=args.random_plies, \
+		fen=args.fen)
+	print('White wins %d, black wins %d, draws %d, unfinished %d' % \
+		(counts[WHITE_WINS], counts[BLACK_WINS], counts[DRAW], counts[UNFINISHED]))
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,118 @@
+# Fixed-size transposition table for the search engine
+
+from array import array
+
+EXACT, LOWER, UPPER = 0, 1, 2  # Bound types
+
+ENTRY_BYTES = 16  # One 64-bit key and one 64-bit packed data word
+SCORE_OFFSET = 1 << 31
+
+# Data word layout:
+#	bits 0-15	move (bitboard.encode_move, 0 for none)
+#	bits 16-23	depth
+#	bits 24-25	bound
+#	bits 26-57	score + SCORE_OFFSET
+#	bits 58-63	search generation
+
+
+class HashTable:
+	# Sizing and hit counting shared by the engine's preallocated hash tables.
+	# Subclasses give the size of an entry and the number of slots per bucket, and
+	# allocate their arrays, including self.keys, in allocate(entries).
+	entry_bytes = ENTRY_BYTES
+	slots = 1
+
+	def __init__(self, size_mb):
+		self.resize(size_mb)
+
+	def resize(self, size_mb):
+		# Reallocate the table to use at most size_mb megabytes, clearing it
+		buckets = 1
+		while buckets * 2 * self.slots * self.entry_bytes <= size_mb * (1 << 20):
+			buckets *= 2
+		self.size_mb = size_mb
+		self.mask = buckets - 1
+		self.allocate(buckets * self.slots)
+		self.reset_stats()
+
+	def clear(self):
+		self.allocate(len(self.keys))
+
+	def reset_stats(self):
+		self.hits = 0
+		self.misses = 0
+
+	def hit_rate(self):
+		probes = self.hits + self.misses
+		return self.hits / probes if probes else 0.0
+
+	def stats(self):
+		return {'size_mb':self.size_mb, 'entries':len(self.keys), 'hits':self.hits, \
+			'misses':self.misses, 'hit_rate':self.hit_rate()}
+
+
+class TranspositionTable(HashTable):
+	# A preallocated hash table of search results keyed by Zobrist hash.
+	# Each bucket has two slots: a depth-preferred slot that keeps the deepest
+	# result from the current search, and an always-replace slot for everything else.
+	slots = 2
+
+	def __init__(self, size_mb=16):
+		HashTable.__init__(self, size_mb)
+
+	def allocate(self, entries):
+		self.keys = array('Q', [0]) * entries
+		self.data = array('Q', [0]) * entries
+		self.generation = 0
+
+	def reset_stats(self):
+		HashTable.reset_stats(self)
+		self.collisions = 0  # Probes that found both slots holding other positions
+		self.stores = 0
+
+	def new_search(self):
+		# Age the table so entries from earlier searches can be replaced first
+		self.generation = (self.generation + 1) & 63
+
+	def probe(self, key):
+		# Returns (move, score, depth, bound) stored for 'key' or None
+		index = (key & self.mask) << 1
+		keys = self.keys
+		if keys[index] != key:
+			index += 1
+			if keys[index] != key:
+				self.misses += 1
+				if keys[index] and keys[index-1]:
+					self.collisions += 1
+				return None
+		self.hits += 1
+		data = self.data[index]
+		return (data & 0xFFFF, ((data >> 26) & 0xFFFFFFFF) - SCORE_OFFSET, \
+			(data >> 16) & 0xFF, (data >> 24) & 3)
+
+	def store(self, key, move, score, depth, bound):
+		index = (key & self.mask) << 1
+		keys, data = self.keys, self.data
+		stored = data[index]
+		# Use the depth-preferred slot if it holds this position, a shallower result
+		# or a result from an earlier search, otherwise the always-replace slot
+		if keys[index] != key and (stored >> 16) & 0xFF > depth and stored >> 58 == self.generation:
+			index += 1
+			stored = data[index]
+		if not move and keys[index] == key:
+			move = stored & 0xFFFF  # Keep the best move found by an earlier search
+		keys[index] = key
+		data[index] = move | (depth & 0xFF) << 16 | bound << 24 | \
+			(score + SCORE_OFFSET) << 26 | self.generation << 58
+		self.stores += 1
+
+	def usage(self):
+		# Fraction of slots holding an entry from the current search, sampled over the first 1000 slots
+		sample = min(1000, len(self.keys))
+		used = sum(1 for i in range(sample) if self.keys[i] and self.data[i] >> 58 == self.generation)
+		return used / sample
+
+	def stats(self):
+		stats = HashTable.stats(self)
+		stats.update({'collisions':self.collisions, 'stores':self.stores})
+		return stats
@@ -0,0 +1,252 @@
+# Universal Chess Interface front-end for chess.py
+#
+# Usage:
+#	python uci.py
+#
+# Reads UCI commands on stdin and answers on stdout so the engine can be used
+# from chess GUIs and match runners. Supported commands are uci, isready,
+# ucinewgame, setoption name Hash value MB, setoption name NullMove|LMR|Futility
+# value true|false, setoption name Book value FILE (empty for none), position [startpos | fen FEN]
+# [moves ...], go [depth N] [nodes N] [movetime MS] [wtime MS] [btime MS]
+# [winc MS] [binc MS] [movestogo N] [infinite], stop and quit.
+# Searches run in a background thread so stop and isready are answered at once.
+
+import sys
+import threading
+
+from chess import Chess, START_FEN, WHITE
+from search import MATE_SCORE, MAX_PLY
+from book import OpeningBook
+
+ENGINE_NAME = 'chess.py'
+ENGINE_AUTHOR = 'Adam R. Smith'
+# Check options switching search techniques on and off, by their Chess.search_settings key
+SEARCH_OPTIONS = (('NullMove', 'null_move'), ('LMR', 'lmr'), ('Futility', 'futility'))
+DEFAULT_HASH_MB = 16
+MOVE_OVERHEAD_MS = 50  # Kept back from every time budget for communication delays
+
+
+def uci_move(move):
+	# Converts a move of the form returned by Chess.get_best_move to UCI notation
+	string = ''
+	for row, col in move[:2]:
+		string += chr(col+97) + str(8-row)
+	if len(move) > 2:
+		string += 'n' if move[2] == 'knight' else move[2][0]
+	return string
+
+
+def uci_score(score):
+	# Converts a search score to 'cp N' or 'mate N', where N is in moves
+	if abs(score) >= MATE_SCORE - MAX_PLY:
+		plies = MATE_SCORE - abs(score)
+		return 'mate %d' % ((plies + 1) // 2 if score > 0 else -((plies + 1) // 2))
+	return 'cp %d' % score
+
+
+def parse_go(args):
+	# Returns a dictionary of the numeric go parameters plus 'infinite'
+	limits = {'infinite': False}
+	i = 0
+	while i < len(args):
+		if args[i] == 'infinite':
+			limits['infinite'] = True
+		elif args[i] in ('depth', 'nodes', 'movetime', 'wtime', 'btime', 'winc', 'binc', 'movestogo') \
+			and i+1 < len(args):
+			try:
+				limits[args[i]] = int(args[i+1])
+			except ValueError:
+				pass
+			i += 1
+		i += 1
+	return limits
+
+
+def time_budget(limits, color):
+	# Milliseconds to search for one move, or None if the search is not timed
+	if 'movetime' in limits:
+		return max(1, limits['movetime'] - MOVE_OVERHEAD_MS)
+	remaining = limits.get('wtime' if color == WHITE else 'btime')
+	if remaining is None:
+		return None
+	increment = limits.get('winc' if color == WHITE else 'binc', 0)
+	budget = remaining // limits.get('movestogo', 30) + increment * 3 // 4
+	return max(1, min(budget, remaining - MOVE_OVERHEAD_MS))
+
+
+class UCIEngine:
+	# Keeps the game position between commands and runs searches in a worker thread
+
+	def __init__(self, out=sys.stdout):
+		self.out = out
+		self.output_lock = threading.Lock()
+		self.game = Chess()
+		self.game.set_table_size(DEFAULT_HASH_MB)
+		self.thread = None
+		self.snapshot = None  # Copy of the game being searched by the worker thread
+		self.stop_requested = threading.Event()
+
+	def send(self, line):
+		with self.output_lock:
+			self.out.write(line + '\n')
+			self.out.flush()
+
+	def loop(self, stream=sys.stdin):
+		# Handle commands until quit or the end of the input
+		for line in stream:
+			if not self.handle(line):
+				break
+		self.stop()
+
+	def handle(self, line):
+		# Handle one command, returning False if the engine should quit
+		tokens = line.split()
+		if not tokens:
+			return True
+		command, args = tokens[0], tokens[1:]
+
+		if command == 'uci':
+			self.send('id name ' + ENGINE_NAME)
+			self.send('id author ' + ENGINE_AUTHOR)
+			self.send('option name Hash type spin default %d min 1 max 4096' % DEFAULT_HASH_MB)
+			for name, _ in SEARCH_OPTIONS:
+				self.send('option name %s type check default true' % name)
+			self.send('option name Book type string default <empty>')
+			self.send('uciok')
+		elif command == 'isready':
+			self.send('readyok')
+		elif command == 'ucinewgame':
+			self.stop()
+			self.game.transposition_table.clear()
+			self.game.set_fen(START_FEN)
+		elif command == 'setoption':
+			self.set_option(args)
+		elif command == 'position':
+			self.stop()
+			self.set_position(args)
+		elif command == 'go':
+			self.stop()
+			self.go(parse_go(args))
+		elif command == 'stop':
+			self.stop()
+		elif command == 'quit':
+			return False
+		return True
+
+	def set_option(self, args):
+		# setoption name <name> value <value>
+		if 'name' not in args or 'value' not in args:
+			return
+		name = ' '.join(args[args.index('name')+1:args.index('value')]).lower()
+		value = ' '.join(args[args.index('value')+1:])
+		if name == 'hash':
+			try:
+				size_mb = max(1, int(value))
+			except ValueError:
+				return
+			self.stop()
+			self.game.set_table_size(size_mb)
+		elif name == 'book':
+			self.stop()
+			self.set_book(value)
+		for option, key in SEARCH_OPTIONS:
+			if name == option.lower():
+				self.game.search_settings = dict(self.game.search_settings, **{key:value.lower() == 'true'})
+
+	def set_book(self, path):
+		# Open the opening book at 'path', closing the previous one, or play without a book
+		# if the path is empty
+		if self.game.book is not None:
+			self.game.book.close()
+			self.game.book = None
+		if path and path != '<empty>':
+			try:
+				self.game.book = OpeningBook(path)
+			except (OSError, ValueError) as error:
+				self.send('info string cannot open book: %s' % error)
+
+	def set_position(self, args):
+		# position [startpos | fen <fen>] [moves <move> ...]
+		moves = args.index('moves') if 'moves' in args else len(args)
+		if args and args[0] == 'fen':
+			fen = ' '.join(args[1:moves])
+		else:
+			fen = START_FEN
+		try:
+			game = Chess.from_fen(fen)
+		except ValueError:
+			self.send('info string invalid fen ' + fen)
+			return
+		# Keep the tables, book and settings of the previous position
+		game.transposition_table, game.pawn_table = self.game.transposition_table, self.game.pawn_table
+		game.book, game.search_settings = self.game.book, self.game.search_settings
+		self.game = game
+		for string in args[moves+1:]:
+			move = self.game.find_move(string)
+			if move is None:
+				self.send('info string illegal move ' + string)
+				return
+			self.game.push(move)
+
+	def go(self, limits):
+		self.stop_requested.clear()
+		self.snapshot = self.game.copy()
+		self.thread = threading.Thread(target=self.search, args=(self.snapshot, limits), daemon=True)
+		self.thread.start()
+
+	def search(self, game, limits):
+		# Runs in the worker thread and always finishes by sending bestmove
+		def on_iteration(depth, score, nodes, seconds, pv):
+			if self.stop_requested.is_set():
+				game.stop_search()  # stop arrived before the search had started
+			self.send('info depth %d score %s nodes %d nps %d time %d hashfull %d pv %s' % \
+				(depth, uci_score(score), nodes, nodes / max(seconds, 1e-6), seconds * 1000, \
+				game.transposition_table.usage() * 1000, ' '.join(uci_move(move) for move in pv)))
+
+		result = None
+		try:
+			time_ms = None if limits['infinite'] else time_budget(limits, game.turn)
+			depth = limits.get('depth')
+			if depth is None and time_ms is None and 'nodes' not in limits:
+				depth = MAX_PLY  # Search until stopped
+			result = game.get_best_move(game.turn, time_ms, depth, limits.get('nodes'), on_iteration)
+			if game.search_stats:
+				self.send('info string first move cutoffs %.1f%% of %d' % \
+					(100 * game.search_stats['first_move_cutoff_rate'], game.search_stats['cutoffs']))
+			elif result is not None and result[0] is not None:
+				self.send('info string book move')
+
+			# In infinite mode bestmove must wait for stop even if the search ended by itself
+			if limits['infinite']:
+				self.stop_requested.wait()
+		except Exception as error:
+			result = None
+			self.send('info string search failed: %r' % error)
+		finally:
+			if result is None or result[0] is None:
+				self.send('bestmove 0000')
+			else:
+				move, _, pv = result
+				if len(pv) > 1:
+					self.send('bestmove %s ponder %s' % (uci_move(move), uci_move(pv[1])))
+				else:
+					self.send('bestmove ' + uci_move(move))
+
+	def stop(self):
+		# Stop a running search and wait for it to send its best move
+		if self.thread is None:
+			return
+		self.stop_requested.set()
+		self.snapshot.stop_search()
+		self.thread.join()
+		self.thread = None
+		self.snapshot = None
+
+
+def main():
+	UCIEngine().loop()
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
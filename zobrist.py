@@ -0,0 +1,48 @@
+# Zobrist hashing keys for chess positions
+
+import random
+
+from bitboard import COLOR_INDEX, PAWN
+
+_rng = random.Random(0x5EED)  # Fixed seed so hashes are stable between runs and processes
+
+# PIECE_KEYS[side][kind][sq]
+PIECE_KEYS = [[[_rng.getrandbits(64) for _ in range(64)] for _ in range(6)] for _ in range(2)]
+BLACK_TO_MOVE = _rng.getrandbits(64)
+CASTLING_KEYS = [_rng.getrandbits(64) for _ in range(16)]
+EP_FILE_KEYS = [_rng.getrandbits(64) for _ in range(8)]
+
+
+def zobrist_hash(board, turn, castling, ep_square):
+	# Computes the hash of a position from scratch
+	h = 0
+	for pos, piece in board.items():
+		h ^= PIECE_KEYS[COLOR_INDEX[piece.color]][piece.kind][pos[0]*8 + pos[1]]
+	if turn == 'black':
+		h ^= BLACK_TO_MOVE
+	h ^= CASTLING_KEYS[castling]
+	h ^= ep_key(board, turn, ep_square)
+	return h
+
+
+def ep_key(board, turn, ep_square):
+	# Returns the key of an en passant square, or 0 if there is none or no pawn of the
+	# side to move stands next to it to capture. Positions that only differ by an en
+	# passant square nobody can use are the same position and hash the same.
+	if ep_square is None:
+		return 0
+	row = ep_square[0] + (1 if turn == 'white' else -1)
+	for col in (ep_square[1] - 1, ep_square[1] + 1):
+		piece = board.get((row, col))
+		if piece is not None and piece.kind == PAWN and piece.color == turn:
+			return EP_FILE_KEYS[ep_square[1]]
+	return 0
+
+
+def pawn_hash(board):
+	# Computes the hash of the pawns of a position from scratch, using the same keys
+	h = 0
+	for pos, piece in board.items():
+		if piece.kind == PAWN:
+			h ^= PIECE_KEYS[COLOR_INDEX[piece.color]][PAWN][pos[0]*8 + pos[1]]
+	return h